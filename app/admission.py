@@ -0,0 +1,212 @@
+import os
+import time
+import asyncio
+
+from collections import deque, OrderedDict
+from typing import Annotated
+
+from fastapi import HTTPException, Header, Depends
+from fastapi.concurrency import run_in_threadpool
+
+from metrics import Counter, Gauge, Histogram
+
+IMAGE_MODEL_MAX_IN_FLIGHT = int(os.environ.get("IMAGE_MODEL_MAX_IN_FLIGHT", "2"))
+IMAGE_MODEL_MAX_QUEUE = int(os.environ.get("IMAGE_MODEL_MAX_QUEUE", "16"))
+PRICE_MODEL_MAX_IN_FLIGHT = int(os.environ.get("PRICE_MODEL_MAX_IN_FLIGHT", "4"))
+PRICE_MODEL_MAX_QUEUE = int(os.environ.get("PRICE_MODEL_MAX_QUEUE", "32"))
+MODEL_USER_MAX_IN_FLIGHT = int(os.environ.get("MODEL_USER_MAX_IN_FLIGHT", "1"))
+MODEL_USER_MAX_QUEUE = int(os.environ.get("MODEL_USER_MAX_QUEUE", "4"))
+MODEL_USER_QUOTA = int(os.environ.get("MODEL_USER_QUOTA", "0"))
+MODEL_USER_QUOTA_WINDOW_SECONDS = int(os.environ.get("MODEL_USER_QUOTA_WINDOW_SECONDS", "60"))
+MODEL_USAGE_MAX_USERS = int(os.environ.get("MODEL_USAGE_MAX_USERS", "10000"))
+MODEL_DEFAULT_DEADLINE_SECONDS = float(os.environ.get("MODEL_DEFAULT_DEADLINE_SECONDS", "10"))
+MODEL_MAX_DEADLINE_SECONDS = float(os.environ.get("MODEL_MAX_DEADLINE_SECONDS", "60"))
+MODEL_RETRY_AFTER = os.environ.get("MODEL_RETRY_AFTER", "2")
+
+model_queue_depth = Gauge("model_queue_depth", "Prediction requests waiting for a model slot", ("model",))
+model_queue_users = Gauge("model_queue_users", "Users with prediction requests waiting for a model slot", ("model",))
+model_queue_wait = Histogram("model_queue_wait_seconds", "Time a prediction request waited for a model slot", ("model",))
+model_quota_users = Gauge("model_quota_users", "Users with quota counters in the current window (no user ids are exported)", ("model",))
+model_admission_rejected = Counter("model_admission_rejected_total", "Prediction requests rejected by admission control", ("model", "reason"))
+
+def get_request_deadline(x_request_timeout_ms: Annotated[int | None, Header()] = None) -> float:
+    # Client boleh mengirim sisa waktu tunggunya, dibatasi MODEL_MAX_DEADLINE_SECONDS
+    timeout = MODEL_DEFAULT_DEADLINE_SECONDS
+
+    if x_request_timeout_ms is not None and x_request_timeout_ms > 0:
+        timeout = min(x_request_timeout_ms / 1000, MODEL_MAX_DEADLINE_SECONDS)
+
+    return time.monotonic() + timeout
+
+RequestDeadline = Annotated[float, Depends(get_request_deadline)]
+
+class _Waiter:
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        # True jika mendapat slot, False jika dibuang karena deadline lewat
+        self.future = asyncio.get_running_loop().create_future()
+
+class _Usage:
+    def __init__(self, window_start: float):
+        self.window_start = window_start
+        self.requests = 0
+        self.rejected = 0
+
+class ModelGate:
+    # Semua state hanya disentuh dari event loop, menunggu slot tidak memakai thread threadpool
+    def __init__(self, name: str, max_in_flight: int, max_queue: int, max_user_in_flight: int = MODEL_USER_MAX_IN_FLIGHT, max_user_queue: int = MODEL_USER_MAX_QUEUE, user_quota: int = MODEL_USER_QUOTA, quota_window: int = MODEL_USER_QUOTA_WINDOW_SECONDS, max_usage_users: int = MODEL_USAGE_MAX_USERS):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_user_in_flight = max_user_in_flight
+        self.max_user_queue = max_user_queue
+        self.user_quota = user_quota
+        self.quota_window = quota_window
+        self.max_usage_users = max_usage_users
+
+        self._in_flight = 0
+        self._queued = 0
+        self._user_in_flight: dict[int, int] = {}
+        # Antrian per user, urutan key adalah giliran round-robin
+        self._queues: OrderedDict[int, deque[_Waiter]] = OrderedDict()
+        # Pemakaian per user dalam window quota berjalan, LRU dan dibatasi max_usage_users
+        self._usage: OrderedDict[int, _Usage] = OrderedDict()
+
+    def _usage_of(self, user_id: int) -> _Usage:
+        now = time.monotonic()
+        usage = self._usage.get(user_id)
+
+        if usage is None or now - usage.window_start >= self.quota_window:
+            usage = self._usage[user_id] = _Usage(now)
+
+            while len(self._usage) > self.max_usage_users:
+                self._usage.popitem(last=False)
+
+            model_quota_users.set(len(self._usage), model=self.name)
+
+        self._usage.move_to_end(user_id)
+
+        return usage
+
+    def _reject(self, user_id: int, reason: str):
+        model_admission_rejected.inc(model=self.name, reason=reason)
+        self._usage_of(user_id).rejected += 1
+
+        raise HTTPException(503, detail="Service Unavailable, please try again later", headers={"Retry-After": MODEL_RETRY_AFTER})
+
+    def _can_start(self, user_id: int) -> bool:
+        return self._in_flight < self.max_in_flight and self._user_in_flight.get(user_id, 0) < self.max_user_in_flight
+
+    def _start(self, user_id: int):
+        self._in_flight += 1
+        self._user_in_flight[user_id] = self._user_in_flight.get(user_id, 0) + 1
+
+    def _update_queue_metrics(self):
+        model_queue_depth.set(self._queued, model=self.name)
+        model_queue_users.set(len(self._queues), model=self.name)
+
+    def _remove_waiter(self, user_id: int, waiter: _Waiter):
+        waiters = self._queues.get(user_id)
+
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            self._queued -= 1
+
+            if not waiters:
+                del self._queues[user_id]
+
+        self._update_queue_metrics()
+
+    def _dispatch(self):
+        now = time.monotonic()
+
+        while self._in_flight < self.max_in_flight:
+            # User pertama (sesuai giliran) yang masih di bawah batas per-user mendapat slot
+            for user_id, waiters in self._queues.items():
+                # Request yang deadline-nya lewat dibuang, tidak ada gunanya menjalankan inference untuknya
+                while waiters and waiters[0].deadline <= now:
+                    waiters.popleft().future.set_result(False)
+                    self._queued -= 1
+
+                if waiters and self._can_start(user_id):
+                    break
+            else:
+                break
+
+            waiter = waiters.popleft()
+            self._queued -= 1
+            waiter.future.set_result(True)
+
+            self._start(user_id)
+            self._queues.move_to_end(user_id)
+
+        for user_id in [user_id for user_id, waiters in self._queues.items() if not waiters]:
+            del self._queues[user_id]
+
+        self._update_queue_metrics()
+
+    def _abandon(self, user_id: int, waiter: _Waiter):
+        if waiter.future.done() and waiter.future.result():
+            # Slot diberikan tepat saat waiter berhenti menunggu, dikembalikan ke antrian
+            self._release(user_id)
+        else:
+            self._remove_waiter(user_id, waiter)
+
+    async def _acquire(self, user_id: int, deadline: float):
+        usage = self._usage_of(user_id)
+        usage.requests += 1
+
+        if self.user_quota and usage.requests > self.user_quota:
+            self._reject(user_id, "user_quota")
+
+        if self._can_start(user_id) and user_id not in self._queues:
+            self._start(user_id)
+            return
+
+        if self._queued >= self.max_queue:
+            self._reject(user_id, "queue_full")
+
+        if len(self._queues.get(user_id, ())) >= self.max_user_queue:
+            self._reject(user_id, "user_queue_full")
+
+        waiter = _Waiter(deadline)
+        self._queues.setdefault(user_id, deque()).append(waiter)
+        self._queued += 1
+        self._update_queue_metrics()
+
+        started = time.monotonic()
+
+        try:
+            granted = await asyncio.wait_for(asyncio.shield(waiter.future), max(0, deadline - started))
+        except asyncio.TimeoutError:
+            granted = False
+        except asyncio.CancelledError:
+            self._abandon(user_id, waiter)
+            raise
+
+        if not granted:
+            self._abandon(user_id, waiter)
+            self._reject(user_id, "deadline")
+
+        model_queue_wait.observe(time.monotonic() - started, model=self.name)
+
+    def _release(self, user_id: int):
+        self._in_flight -= 1
+        self._user_in_flight[user_id] -= 1
+
+        if not self._user_in_flight[user_id]:
+            del self._user_in_flight[user_id]
+
+        self._dispatch()
+
+    async def run(self, user_id: int, deadline: float, function, *args):
+        await self._acquire(user_id, deadline)
+
+        try:
+            # Thread threadpool hanya dipakai selama inference berjalan
+            return await run_in_threadpool(function, *args)
+        finally:
+            self._release(user_id)
+
+image_model_gate = ModelGate("image_model", IMAGE_MODEL_MAX_IN_FLIGHT, IMAGE_MODEL_MAX_QUEUE)
+price_model_gate = ModelGate("price_model", PRICE_MODEL_MAX_IN_FLIGHT, PRICE_MODEL_MAX_QUEUE)
@@ -1,4 +1,6 @@
 import os
+import hmac
+import hashlib
 
 from typing import Annotated
 from datetime import datetime, timedelta, timezone
@@ -9,7 +11,7 @@ from fastapi.security import OAuth2PasswordBearer
 import jwt
 import bcrypt
 
-from model.model import AccessTokenPayload
+from model.model import AccessTokenPayload, UploadSessionPayload, ResetPasswordPayload
 
 ACCESS_SECRET = os.environ.get("ACCESS_SECRET", "abcde")
 JWT_ALGORITHM = os.environ.get("JWT_ALGORITHM", "HS256")
@@ -20,6 +22,12 @@ ACCESS_TOKEN_EXPR_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPR_MINUTES", "30"
 
 RESET_PASSWORD_EXPR_MINUTES = int(os.environ.get("RESET_PASSWORD_EXPR_MINUTES", "10"))
 
+# database: token disimpan di tabel Forgot_Password, signed: token ditandatangani dan tidak disimpan
+RESET_PASSWORD_TOKEN_MODE = os.environ.get("RESET_PASSWORD_TOKEN_MODE", "database")
+RESET_PASSWORD_SECRET = os.environ.get("RESET_PASSWORD_SECRET", ACCESS_SECRET)
+
+UPLOAD_SESSION_EXPR_MINUTES = int(os.environ.get("UPLOAD_SESSION_EXPR_MINUTES", "15"))
+
 oauth_scheme = OAuth2PasswordBearer(tokenUrl="user/login")
 
 def encode_jwt(payload: AccessTokenPayload) -> str:
@@ -39,6 +47,49 @@ def validate_jwt(payload: Annotated[AccessTokenPayload, Depends(decode_jwt)]):
         raise HTTPException(403, detail="Token Expire")
     return payload
 
+UPLOAD_SESSION_AUDIENCE = "upload-session"
+
+def encode_upload_session(payload: UploadSessionPayload) -> str:
+    # Claim "aud" membuat token ini ditolak oleh decode_jwt, sehingga tidak bisa dipakai sebagai access token
+    return jwt.encode({**payload.model_dump(), "aud": UPLOAD_SESSION_AUDIENCE}, ACCESS_SECRET, JWT_ALGORITHM)
+
+def decode_upload_session(token: str, user_id: int, purpose: str) -> UploadSessionPayload:
+    try:
+        payload = UploadSessionPayload(**jwt.decode(token, ACCESS_SECRET, JWT_ALGORITHM, audience=UPLOAD_SESSION_AUDIENCE))
+    except:
+        raise HTTPException(400, detail="Invalid upload session")
+
+    if payload.id != user_id or payload.purpose != purpose:
+        raise HTTPException(400, detail="Invalid upload session")
+
+    if int(datetime.now(timezone.utc).timestamp()) > payload.expr:
+        raise HTTPException(400, detail="Upload session expired")
+
+    return payload
+
+RESET_PASSWORD_AUDIENCE = "reset-password"
+
+def password_fingerprint(hashed_password: str) -> str:
+    # Berubah setiap kali password diganti, sehingga token reset lama otomatis tidak berlaku
+    return hashlib.sha256(hashed_password.encode()).hexdigest()[:32]
+
+def encode_reset_password_token(payload: ResetPasswordPayload) -> str:
+    return jwt.encode({**payload.model_dump(), "aud": RESET_PASSWORD_AUDIENCE}, RESET_PASSWORD_SECRET, JWT_ALGORITHM)
+
+def decode_reset_password_token(token: str) -> ResetPasswordPayload | None:
+    try:
+        payload = ResetPasswordPayload(**jwt.decode(token, RESET_PASSWORD_SECRET, JWT_ALGORITHM, audience=RESET_PASSWORD_AUDIENCE))
+    except:
+        return None
+
+    if int(datetime.now(timezone.utc).timestamp()) > payload.expr:
+        return None
+
+    return payload
+
+def is_reset_password_token_current(payload: ResetPasswordPayload, hashed_password: str) -> bool:
+    return hmac.compare_digest(payload.fingerprint, password_fingerprint(hashed_password))
+
 def hash_password(password: str) -> str:
     hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt(BCRYPT_SALT_ROUND))
     return hashed_password.decode()
@@ -46,8 +97,8 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(password.encode(), hashed_password.encode())
 
-def generate_expire_time() -> int:
-    expire_time = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPR_MINUTES)
+def generate_expire_time(minutes: int = ACCESS_TOKEN_EXPR_MINUTES) -> int:
+    expire_time = datetime.now(timezone.utc) + timedelta(minutes=minutes)
 
     return int(expire_time.timestamp())
 
@@ -0,0 +1,53 @@
+import logging
+import threading
+
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+class PeriodicTask:
+    def __init__(self, name: str, interval: float, function: Callable[[], None], run_on_stop: bool = False):
+        self.name = name
+        self.interval = interval
+        self.function = function
+        self.run_on_stop = run_on_stop
+
+        self._wake_event = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0:
+            return
+
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stopping = True
+        self._wake_event.set()
+
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wake(self):
+        # Jalankan lebih awal tanpa menunggu interval berikutnya
+        self._wake_event.set()
+
+    def _run(self):
+        while True:
+            self._wake_event.wait(self.interval)
+            self._wake_event.clear()
+
+            if self._stopping and not self.run_on_stop:
+                return
+
+            try:
+                self.function()
+            except Exception:
+                logger.exception("Periodic task %s failed", self.name)
+
+            if self._stopping:
+                return
@@ -0,0 +1,274 @@
+import os
+import shutil
+import threading
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterator
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "gcs")
+
+STORAGE_HTTP_POOL_SIZE = int(os.environ.get("STORAGE_HTTP_POOL_SIZE", "10"))
+STORAGE_CONNECT_TIMEOUT = float(os.environ.get("STORAGE_CONNECT_TIMEOUT", "5"))
+STORAGE_READ_TIMEOUT = float(os.environ.get("STORAGE_READ_TIMEOUT", "60"))
+STORAGE_RETRY_DEADLINE = float(os.environ.get("STORAGE_RETRY_DEADLINE", "120"))
+
+STORAGE_BATCH_LIMIT = 100
+
+LOCAL_STORAGE_DIRECTORY = os.environ.get("LOCAL_STORAGE_DIRECTORY", "app/storage")
+LOCAL_STORAGE_PUBLIC_URL = os.environ.get("LOCAL_STORAGE_PUBLIC_URL", "http://127.0.0.1:8000/local-storage")
+LOCAL_STORAGE_UPLOAD_URL = os.environ.get("LOCAL_STORAGE_UPLOAD_URL", "http://127.0.0.1:8000/local-storage-upload")
+
+class StorageBackend(ABC):
+    @abstractmethod
+    def upload_file(self, file: BinaryIO, key: str, bucket: str, content_type: str | None = None):
+        pass
+
+    @abstractmethod
+    def download_to_filename(self, key: str, destination_file: str, bucket: str):
+        pass
+
+    @abstractmethod
+    def delete(self, key: str, bucket: str):
+        pass
+
+    @abstractmethod
+    def delete_many(self, keys: list[str], bucket: str):
+        pass
+
+    @abstractmethod
+    def list_objects(self, prefix: str, bucket: str) -> Iterator[tuple[str, datetime]]:
+        pass
+
+    @abstractmethod
+    def create_upload_session(self, key: str, bucket: str, content_type: str, size: int) -> str:
+        pass
+
+    @abstractmethod
+    def move(self, source_key: str, destination_key: str, bucket: str):
+        pass
+
+    @abstractmethod
+    def object_size(self, key: str, bucket: str) -> int | None:
+        pass
+
+    @abstractmethod
+    def open_read(self, key: str, bucket: str) -> BinaryIO:
+        pass
+
+    @abstractmethod
+    def public_url(self, key: str, bucket: str) -> str:
+        pass
+
+class GoogleCloudStorageBackend(StorageBackend):
+    def __init__(self):
+        import google.auth
+        from google.auth.transport.requests import AuthorizedSession
+        from google.cloud import storage
+        from google.cloud.storage.retry import DEFAULT_RETRY
+        from requests.adapters import HTTPAdapter
+
+        credentials, project = google.auth.default(scopes=["https://www.googleapis.com/auth/devstorage.read_write"])
+
+        # Satu session HTTP (connection pool) dipakai ulang oleh semua request
+        http_session = AuthorizedSession(credentials)
+        adapter = HTTPAdapter(pool_connections=STORAGE_HTTP_POOL_SIZE, pool_maxsize=STORAGE_HTTP_POOL_SIZE)
+        http_session.mount("https://", adapter)
+
+        self.client = storage.Client(project=project, credentials=credentials, _http=http_session)
+        self.timeout = (STORAGE_CONNECT_TIMEOUT, STORAGE_READ_TIMEOUT)
+        self.retry = DEFAULT_RETRY.with_timeout(STORAGE_RETRY_DEADLINE)
+
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, name: str):
+        bucket = self._buckets.get(name)
+
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(name, self.client.bucket(name))
+
+        return bucket
+
+    def upload_file(self, file: BinaryIO, key: str, bucket: str, content_type: str | None = None):
+        blob = self._bucket(bucket).blob(key)
+
+        blob.upload_from_file(file, content_type=content_type, if_generation_match=0, timeout=self.timeout, retry=self.retry)
+
+    def download_to_filename(self, key: str, destination_file: str, bucket: str):
+        blob = self._bucket(bucket).blob(key)
+
+        blob.download_to_filename(destination_file, timeout=self.timeout, retry=self.retry)
+
+    def delete(self, key: str, bucket: str):
+        self._bucket(bucket).delete_blob(key, timeout=self.timeout, retry=self.retry)
+
+    def delete_many(self, keys: list[str], bucket: str):
+        bucket = self._bucket(bucket)
+
+        for i in range(0, len(keys), STORAGE_BATCH_LIMIT):
+            # Object yang sudah tidak ada (404) diabaikan
+            with self.client.batch(raise_exception=False):
+                for key in keys[i:i + STORAGE_BATCH_LIMIT]:
+                    bucket.delete_blob(key, timeout=self.timeout)
+
+    def list_objects(self, prefix: str, bucket: str) -> Iterator[tuple[str, datetime]]:
+        blobs = self.client.list_blobs(bucket, prefix=prefix, fields="items(name,updated),nextPageToken", timeout=self.timeout, retry=self.retry)
+
+        for blob in blobs:
+            yield blob.name, blob.updated
+
+    def create_upload_session(self, key: str, bucket: str, content_type: str, size: int) -> str:
+        blob = self._bucket(bucket).blob(key)
+
+        # URL resumable upload bisa dipakai client tanpa credential, jadi file tidak lewat server API
+        # size membuat GCS menolak upload yang lebih besar dari ukuran yang dideklarasikan client
+        return blob.create_resumable_upload_session(content_type=content_type, size=size, if_generation_match=0, timeout=self.timeout)
+
+    def move(self, source_key: str, destination_key: str, bucket: str):
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+
+        bucket = self._bucket(bucket)
+        source = bucket.blob(source_key)
+
+        try:
+            bucket.copy_blob(source, bucket, destination_key, if_generation_match=0, timeout=self.timeout, retry=self.retry)
+        except PreconditionFailed:
+            # Tujuan sudah ada, berarti object ini sudah dipindahkan oleh request sebelumnya
+            pass
+        except NotFound:
+            if bucket.get_blob(destination_key, timeout=self.timeout, retry=self.retry) is None:
+                raise
+
+            return
+
+        try:
+            source.delete(timeout=self.timeout, retry=self.retry)
+        except NotFound:
+            pass
+
+    def object_size(self, key: str, bucket: str) -> int | None:
+        blob = self._bucket(bucket).get_blob(key, timeout=self.timeout, retry=self.retry)
+
+        return blob.size if blob else None
+
+    def open_read(self, key: str, bucket: str) -> BinaryIO:
+        blob = self._bucket(bucket).blob(key)
+
+        # Dibaca per 1 MiB agar memori tidak ikut membesar sesuai ukuran file
+        return blob.open("rb", chunk_size=1024 * 1024, timeout=self.timeout, retry=self.retry)
+
+    def public_url(self, key: str, bucket: str) -> str:
+        return f"https://storage.googleapis.com/{bucket}/{key}"
+
+class LocalStorageBackend(StorageBackend):
+    def __init__(self, root: str = LOCAL_STORAGE_DIRECTORY, public_url: str = LOCAL_STORAGE_PUBLIC_URL, upload_url: str = LOCAL_STORAGE_UPLOAD_URL):
+        self.root = os.path.abspath(root)
+        self.base_url = public_url.rstrip("/")
+        self.upload_url = upload_url.rstrip("/")
+
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str, bucket: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, bucket, key))
+
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid object key: {key}")
+
+        return path
+
+    def upload_file(self, file: BinaryIO, key: str, bucket: str, content_type: str | None = None):
+        path = self._path(key, bucket)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+
+        with open(temporary_path, "wb") as destination:
+            shutil.copyfileobj(file, destination)
+
+        # Sama seperti if_generation_match=0 di GCS, object yang sudah ada tidak ditimpa
+        try:
+            os.link(temporary_path, path)
+        finally:
+            os.remove(temporary_path)
+
+    def download_to_filename(self, key: str, destination_file: str, bucket: str):
+        shutil.copyfile(self._path(key, bucket), destination_file)
+
+    def delete(self, key: str, bucket: str):
+        os.remove(self._path(key, bucket))
+
+    def delete_many(self, keys: list[str], bucket: str):
+        for key in keys:
+            try:
+                os.remove(self._path(key, bucket))
+            except FileNotFoundError:
+                pass
+
+    def list_objects(self, prefix: str, bucket: str) -> Iterator[tuple[str, datetime]]:
+        bucket_root = os.path.join(self.root, bucket)
+
+        for directory, _, filenames in os.walk(bucket_root):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+
+                path = os.path.join(directory, filename)
+                key = os.path.relpath(path, bucket_root).replace(os.sep, "/")
+
+                if key.startswith(prefix):
+                    yield key, datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+
+    def create_upload_session(self, key: str, bucket: str, content_type: str, size: int) -> str:
+        return f"{self.upload_url}/{bucket}/{key}"
+
+    def move(self, source_key: str, destination_key: str, bucket: str):
+        source = self._path(source_key, bucket)
+        destination = self._path(destination_key, bucket)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+        try:
+            os.link(source, destination)
+        except FileExistsError:
+            pass
+        except FileNotFoundError:
+            if not os.path.exists(destination):
+                raise
+
+            return
+
+        try:
+            os.remove(source)
+        except FileNotFoundError:
+            pass
+
+    def object_size(self, key: str, bucket: str) -> int | None:
+        try:
+            return os.path.getsize(self._path(key, bucket))
+        except FileNotFoundError:
+            return None
+
+    def open_read(self, key: str, bucket: str) -> BinaryIO:
+        return open(self._path(key, bucket), "rb")
+
+    def public_url(self, key: str, bucket: str) -> str:
+        return f"{self.base_url}/{bucket}/{key}"
+
+_storage_gateway: StorageBackend | None = None
+_storage_gateway_lock = threading.Lock()
+
+def get_storage_gateway() -> StorageBackend:
+    global _storage_gateway
+
+    if _storage_gateway is None:
+        with _storage_gateway_lock:
+            if _storage_gateway is None:
+                if STORAGE_BACKEND == "local":
+                    _storage_gateway = LocalStorageBackend()
+                elif STORAGE_BACKEND == "gcs":
+                    _storage_gateway = GoogleCloudStorageBackend()
+                else:
+                    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+    return _storage_gateway
@@ -1,23 +1,118 @@
 import os
+import time
+import random
+import asyncio
+import logging
 
+from sqlalchemy import text
 from sqlalchemy.engine.url import URL
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import create_engine, SQLModel, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.util import EMPTY_DICT
 
 import model.database_model
 
+from background import PeriodicTask
+
 # Env
-database_url = URL.create(
-    drivername='mysql+pymysql',
-    host=os.environ.get("DB_HOST", None) if os.environ.get("APP_ENV", None) == "prod" else '127.0.0.1', # Pilih salah satu
-    port=os.environ.get("DB_PORT", 3306),
-    username=os.environ.get("DB_USERNAME", "root"),
-    password=os.environ.get("DB_PASSWORD", None),
-    database=os.environ.get("DB_DATABASE", "hondealz_app"),
-    query={"unix_socket": os.environ.get("DB_UNIX_SOCKET")} if os.environ.get("APP_ENV", None) == "prod" else EMPTY_DICT # Pilih salah satu
-)
-
-engine = create_engine(database_url, echo=True if __name__ == "__main__" else False)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_WARMUP = int(os.environ.get("DB_POOL_WARMUP", "2"))
+
+DB_REPLICA_HOSTS = [host.strip() for host in os.environ.get("DB_REPLICA_HOSTS", "").split(",") if host.strip()]
+DB_REPLICA_MAX_LAG_SECONDS = float(os.environ.get("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+DB_REPLICA_CHECK_SECONDS = float(os.environ.get("DB_REPLICA_CHECK_SECONDS", "10"))
+
+logger = logging.getLogger(__name__)
+
+def create_database_url(drivername: str, host: str | None = None) -> URL:
+    port = os.environ.get("DB_PORT", 3306)
+
+    if host and ":" in host:
+        host, port = host.rsplit(":", 1)
+
+    return URL.create(
+        drivername=drivername,
+        host=host or (os.environ.get("DB_HOST", None) if os.environ.get("APP_ENV", None) == "prod" else '127.0.0.1'), # Pilih salah satu
+        port=int(port),
+        username=os.environ.get("DB_USERNAME", "root"),
+        password=os.environ.get("DB_PASSWORD", None),
+        database=os.environ.get("DB_DATABASE", "hondealz_app"),
+        query={"unix_socket": os.environ.get("DB_UNIX_SOCKET")} if os.environ.get("APP_ENV", None) == "prod" else EMPTY_DICT # Pilih salah satu
+    )
+
+database_url = create_database_url('mysql+pymysql')
+async_database_url = create_database_url('mysql+aiomysql')
+
+pool_options = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING
+}
+
+engine = create_engine(database_url, echo=True if __name__ == "__main__" else False, **pool_options)
+
+async_engine = create_async_engine(async_database_url, **pool_options)
+
+# Replica hanya dipakai lewat TCP, unix_socket milik primary tidak ikut dipakai
+replica_engines = [create_engine(create_database_url('mysql+pymysql', host).set(query=EMPTY_DICT), **pool_options) for host in DB_REPLICA_HOSTS]
+healthy_replica_engines = list(replica_engines)
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        # Write selalu ke primary: flush ORM meminta bind tanpa clause, insert/update/delete membawa statement DML
+        if self.info.get("use_primary") or clause is None or isinstance(clause, UpdateBase) or not healthy_replica_engines:
+            return engine
+
+        if "replica" not in self.info:
+            self.info["replica"] = random.choice(healthy_replica_engines)
+
+        return self.info["replica"]
+
+def is_recent_write(last_write: str | None) -> bool:
+    # Waktu write terakhir (epoch detik) dikirim balik oleh client, jadi berlaku di semua worker dan instance
+    try:
+        elapsed = time.time() - float(last_write)
+    except (TypeError, ValueError):
+        return False
+
+    return abs(elapsed) <= DB_REPLICA_MAX_LAG_SECONDS
+
+def create_read_session(use_primary: bool = False) -> RoutingSession:
+    # Setelah user menulis data, read berikutnya diarahkan ke primary selama jeda replikasi
+    return RoutingSession(engine, info={"use_primary": use_primary})
+
+def check_replica_lag():
+    global healthy_replica_engines
+
+    healthy = []
+
+    for replica_engine in replica_engines:
+        try:
+            with replica_engine.connect() as connection:
+                status = connection.execute(text("SHOW REPLICA STATUS")).mappings().first()
+        except Exception as e:
+            logger.warning("Replica %s is unreachable: %s", replica_engine.url.host, e)
+            continue
+
+        lag = status["Seconds_Behind_Source"] if status else 0
+
+        if lag is None or lag > DB_REPLICA_MAX_LAG_SECONDS:
+            logger.warning("Replica %s is lagging (%s seconds), reads go to primary", replica_engine.url.host, lag)
+            continue
+
+        healthy.append(replica_engine)
+
+    healthy_replica_engines = healthy
+
+replica_health_check = PeriodicTask("db-replica-health-check", DB_REPLICA_CHECK_SECONDS if replica_engines else 0, check_replica_lag)
 
 def migration():
     SQLModel.metadata.create_all(engine)
@@ -26,5 +121,28 @@ def get_session():
     with Session(engine) as session:
         yield session
 
+def get_read_session():
+    with create_read_session() as session:
+        yield session
+
+async def get_async_session():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+def warm_up_sync_pool(size: int = DB_POOL_WARMUP):
+    connections = [engine.connect() for _ in range(min(size, DB_POOL_SIZE))]
+
+    for connection in connections:
+        connection.close()
+
+async def warm_up_pool(size: int = DB_POOL_WARMUP):
+    # Koneksi dibuka bersamaan lalu dikembalikan ke pool, jadi request pertama tidak perlu handshake
+    connections = await asyncio.gather(*(async_engine.connect() for _ in range(min(size, DB_POOL_SIZE))))
+
+    for connection in connections:
+        await connection.close()
+
+    await asyncio.to_thread(warm_up_sync_pool, size)
+
 if __name__ == "__main__":
     migration()
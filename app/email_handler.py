@@ -1,11 +1,205 @@
 import os
+import time
+import heapq
+import random
 import smtplib
+import logging
+import itertools
+import threading
+
+from email.message import Message
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+from metrics import Counter, Gauge, Histogram
+from request_metrics import track_stage
+
 SENDER_EMAIL = os.environ["SENDER_EMAIL"] # Wajib buat env variabel sendiri
 EMAIL_PASSWORD = os.environ["EMAIL_PASSWORD"] # Wajib buat env variabel sendiri
 
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.environ.get("SMTP_TIMEOUT", "30"))
+SMTP_IDLE_TIMEOUT = float(os.environ.get("SMTP_IDLE_TIMEOUT", "60"))
+EMAIL_OUTBOX_MAX_SIZE = int(os.environ.get("EMAIL_OUTBOX_MAX_SIZE", "1000"))
+EMAIL_BATCH_SIZE = int(os.environ.get("EMAIL_BATCH_SIZE", "20"))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_DELAY = float(os.environ.get("EMAIL_RETRY_BASE_DELAY", "2"))
+EMAIL_RETRY_MAX_DELAY = float(os.environ.get("EMAIL_RETRY_MAX_DELAY", "120"))
+
+logger = logging.getLogger(__name__)
+
+email_outbox_depth = Gauge("email_outbox_depth", "Emails waiting in the outbox")
+email_send_latency = Histogram("email_send_latency_seconds", "Duration of a single SMTP send", ("outcome",))
+email_outbox_age = Histogram("email_outbox_age_seconds", "Time between queueing an email and sending it", buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900))
+email_smtp_connects = Counter("email_smtp_connects_total", "SMTP connections opened (including re-authentication)")
+email_retries = Counter("email_retries_total", "Email sends that failed and were rescheduled")
+email_failures = Counter("email_failures_total", "Emails dropped after the maximum number of attempts")
+
+class OutboxFull(Exception):
+    pass
+
+class EmailOutbox:
+    def __init__(self, max_size: int = EMAIL_OUTBOX_MAX_SIZE, batch_size: int = EMAIL_BATCH_SIZE, max_attempts: int = EMAIL_MAX_ATTEMPTS):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+        self._smtp = None
+        self._last_used = 0.0
+
+    def start(self):
+        with self._condition:
+            self._running = True
+
+        self._thread = threading.Thread(target=self._worker, name="email-sender", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_full(self) -> bool:
+        with self._condition:
+            return len(self._heap) >= self.max_size
+
+    def enqueue(self, message: Message):
+        with self._condition:
+            if len(self._heap) >= self.max_size:
+                raise OutboxFull("Email outbox is full")
+
+            heapq.heappush(self._heap, (time.monotonic(), next(self._sequence), message, 0, time.time()))
+            email_outbox_depth.set(len(self._heap))
+            self._condition.notify()
+
+    def _next_batch(self) -> list | None:
+        with self._condition:
+            while self._running:
+                if self._heap and self._heap[0][0] <= time.monotonic():
+                    batch = []
+
+                    while self._heap and self._heap[0][0] <= time.monotonic() and len(batch) < self.batch_size:
+                        batch.append(heapq.heappop(self._heap))
+
+                    email_outbox_depth.set(len(self._heap))
+                    return batch
+
+                # Koneksi SMTP ditutup jika lama tidak dipakai, server biasanya memutusnya juga
+                timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+
+                if self._smtp is not None:
+                    idle_remaining = self._last_used + SMTP_IDLE_TIMEOUT - time.monotonic()
+
+                    if idle_remaining <= 0:
+                        self._close()
+                    else:
+                        timeout = idle_remaining if timeout is None else min(timeout, idle_remaining)
+
+                self._condition.wait(timeout)
+
+        return None
+
+    def _worker(self):
+        while True:
+            batch = self._next_batch()
+
+            if batch is None:
+                self._close()
+                return
+
+            for entry in batch:
+                self._send(entry)
+
+    def _connect(self) -> smtplib.SMTP:
+        if self._smtp is not None:
+            try:
+                self._smtp.noop()
+                return self._smtp
+            except smtplib.SMTPException:
+                self._close()
+
+        smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+
+        try:
+            if SMTP_STARTTLS:
+                smtp.starttls()
+
+            smtp.login(SENDER_EMAIL, EMAIL_PASSWORD)
+        except Exception:
+            smtp.close()
+            raise
+
+        email_smtp_connects.inc()
+        self._smtp = smtp
+
+        return smtp
+
+    def _close(self):
+        if self._smtp is None:
+            return
+
+        try:
+            self._smtp.quit()
+        except Exception:
+            self._smtp.close()
+
+        self._smtp = None
+
+    def _send(self, entry: tuple):
+        _, sequence, message, attempts, queued_at = entry
+        started = time.perf_counter()
+
+        try:
+            self._connect().send_message(message)
+        except Exception as e:
+            email_send_latency.observe(time.perf_counter() - started, outcome="error")
+
+            # Koneksi yang error dibuang, percobaan berikutnya login ulang
+            self._close()
+            self._retry_or_fail(entry, e)
+            return
+        finally:
+            self._last_used = time.monotonic()
+
+        email_send_latency.observe(time.perf_counter() - started, outcome="success")
+        email_outbox_age.observe(time.time() - queued_at)
+
+    def _retry_or_fail(self, entry: tuple, error: Exception):
+        _, sequence, message, attempts, queued_at = entry
+        attempts += 1
+
+        if attempts >= self.max_attempts:
+            email_failures.inc()
+            logger.error("Giving up email to %s after %d attempts: %s", message["To"], attempts, error)
+            return
+
+        email_retries.inc()
+
+        # Exponential backoff dengan jitter
+        delay = min(EMAIL_RETRY_MAX_DELAY, EMAIL_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+        delay = random.uniform(delay / 2, delay)
+
+        logger.warning("Email to %s failed (attempt %d), retrying in %.1fs: %s", message["To"], attempts, delay, error)
+
+        with self._condition:
+            heapq.heappush(self._heap, (time.monotonic() + delay, sequence, message, attempts, queued_at))
+            email_outbox_depth.set(len(self._heap))
+
+email_outbox = EmailOutbox()
+
+@track_stage("email")
 def send_reset_password_email(receiver_email: str, body: str):
     message = MIMEMultipart()
     message["From"] = SENDER_EMAIL
@@ -14,7 +208,5 @@ def send_reset_password_email(receiver_email: str, body: str):
 
     message.attach(MIMEText(body, "html"))
 
-    with smtplib.SMTP("smtp.gmail.com", 587) as server:
-        server.starttls()
-        server.login(SENDER_EMAIL, EMAIL_PASSWORD)
-        server.send_message(message)
+    # Hanya dimasukkan ke outbox, pengiriman dilakukan oleh thread email-sender
+    email_outbox.enqueue(message)
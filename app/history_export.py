@@ -0,0 +1,66 @@
+import io
+import os
+import csv
+import json
+
+from typing import Iterator, Literal
+
+from sqlmodel import select, desc
+
+from database import create_read_session
+from model.database_model import Motor, Motor_Image
+from utility import get_cloud_storage_public_url, CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY
+
+HISTORY_EXPORT_BATCH_SIZE = int(os.environ.get("HISTORY_EXPORT_BATCH_SIZE", "500"))
+
+HISTORY_EXPORT_COLUMNS = ["id", "image_url", "model", "year", "mileage", "location", "tax", "min_price", "predicted_price", "max_price", "created_at"]
+
+EXPORT_MEDIA_TYPE = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson"
+}
+
+def stream_history_export(user_id: int, export_format: Literal["csv", "ndjson"], use_primary: bool = False) -> Iterator[str]:
+    statement = select(
+        Motor.id,
+        Motor_Image.filename,
+        Motor.model,
+        Motor.year,
+        Motor.mileage,
+        Motor.location,
+        Motor.tax,
+        Motor.min_price,
+        Motor.predicted_price,
+        Motor.max_price,
+        Motor.created_at
+    ).outerjoin(Motor_Image).where(Motor.user_id == user_id).order_by(desc(Motor.created_at), desc(Motor.id))
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if export_format == "csv":
+        writer.writerow(HISTORY_EXPORT_COLUMNS)
+
+    # Session dibuka sendiri karena session dari dependency sudah ditutup saat response di-stream
+    with create_read_session(use_primary) as session:
+        # yield_per memakai server-side cursor, jadi hanya satu batch baris yang ada di memori
+        result = session.exec(statement.execution_options(yield_per=HISTORY_EXPORT_BATCH_SIZE))
+
+        for rows in result.partitions():
+            for row in rows:
+                values = list(row)
+                values[1] = get_cloud_storage_public_url(values[1], CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY) if values[1] else None
+                values[10] = values[10].isoformat()
+
+                if export_format == "csv":
+                    writer.writerow(values)
+                else:
+                    buffer.write(json.dumps(dict(zip(HISTORY_EXPORT_COLUMNS, values))) + "\n")
+
+            yield buffer.getvalue()
+
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+
+from collections import OrderedDict
+from typing import Any, BinaryIO
+
+from fastapi import HTTPException
+
+from metrics import Counter
+
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_KEYS_PER_USER = int(os.environ.get("IDEMPOTENCY_MAX_KEYS_PER_USER", "50"))
+IDEMPOTENCY_MAX_USERS = int(os.environ.get("IDEMPOTENCY_MAX_USERS", "10000"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "60"))
+
+idempotency_requests = Counter("idempotency_requests_total", "Requests carrying an Idempotency-Key header", ("route", "outcome"))
+
+def form_fingerprint(form_data) -> str:
+    return hashlib.sha256(json.dumps(form_data.model_dump(mode="json"), sort_keys=True).encode()).hexdigest()
+
+def upload_fingerprint(file: BinaryIO) -> str:
+    # Blocking, dipanggil lewat run_in_threadpool; posisi file dikembalikan ke awal
+    digest = hashlib.sha256()
+    file.seek(0)
+
+    for chunk in iter(lambda: file.read(1024 * 1024), b""):
+        digest.update(chunk)
+
+    file.seek(0)
+
+    return digest.hexdigest()
+
+class _Entry:
+    def __init__(self, route: str, fingerprint: str | None):
+        self.route = route
+        self.fingerprint = fingerprint
+        self.created = time.monotonic()
+        self.done = asyncio.Event()
+        self.result: Any = None
+        self.error: HTTPException | None = None
+
+class IdempotentCall:
+    def __init__(self, store: "IdempotencyStore | None" = None, key: tuple | None = None, entry: _Entry | None = None, replayed: bool = False):
+        self._store = store
+        self._key = key
+        self._entry = entry
+        self._completed = False
+
+        self.replayed = replayed
+
+    def replay(self):
+        if self._entry.error is not None:
+            raise HTTPException(self._entry.error.status_code, detail=self._entry.error.detail, headers=self._entry.error.headers)
+
+        return self._entry.result
+
+    def complete(self, result):
+        if self._entry is not None:
+            self._entry.result = result
+            self._entry.done.set()
+
+        self._completed = True
+
+        return result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self._entry is None or self._completed:
+            return False
+
+        # Error 4xx bersifat final dan ikut di-replay, selain itu key dilepas supaya retry menghitung ulang
+        if isinstance(exc, HTTPException) and exc.status_code < 500:
+            self._entry.error = exc
+            self._entry.done.set()
+        else:
+            self._store._release(self._key, self._entry)
+
+        return False
+
+class IdempotencyStore:
+    def __init__(self, ttl: int = IDEMPOTENCY_TTL_SECONDS, max_keys_per_user: int = IDEMPOTENCY_MAX_KEYS_PER_USER, max_users: int = IDEMPOTENCY_MAX_USERS, wait_seconds: float = IDEMPOTENCY_WAIT_SECONDS):
+        self.ttl = ttl
+        self.max_keys_per_user = max_keys_per_user
+        self.max_users = max_users
+        self.wait_seconds = wait_seconds
+
+        # user_id -> (Idempotency-Key -> _Entry), keduanya LRU; hanya disentuh dari event loop
+        self._users: OrderedDict[int, OrderedDict[str, _Entry]] = OrderedDict()
+
+    def _lookup(self, user_id: int, key: str, route: str, fingerprint: str | None) -> tuple[_Entry, bool]:
+        entries = self._users.get(user_id)
+
+        if entries is None:
+            entries = self._users[user_id] = OrderedDict()
+
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+        self._users.move_to_end(user_id)
+        entry = entries.get(key)
+
+        if entry is not None and entry.done.is_set() and time.monotonic() - entry.created > self.ttl:
+            del entries[key]
+            entry = None
+
+        if entry is not None:
+            entries.move_to_end(key)
+            return entry, False
+
+        entry = entries[key] = _Entry(route, fingerprint)
+
+        # Request yang masih berjalan tetap memegang entry-nya walaupun sudah tergusur dari store
+        while len(entries) > self.max_keys_per_user:
+            entries.popitem(last=False)
+
+        return entry, True
+
+    def _release(self, key: tuple, entry: _Entry):
+        user_id, idempotency_key = key
+        entries = self._users.get(user_id)
+
+        if entries is not None and entries.get(idempotency_key) is entry:
+            del entries[idempotency_key]
+
+        entry.done.set()
+
+    async def claim(self, user_id: int, idempotency_key: str | None, route: str, fingerprint: str | None) -> IdempotentCall:
+        # Request duplikat yang datang bersamaan menunggu hasil request pertama
+        if idempotency_key is None:
+            return IdempotentCall()
+
+        deadline = time.monotonic() + self.wait_seconds
+
+        while True:
+            entry, created = self._lookup(user_id, idempotency_key, route, fingerprint)
+
+            if entry.route != route or entry.fingerprint != fingerprint:
+                idempotency_requests.inc(route=route, outcome="mismatch")
+                raise HTTPException(422, detail="Idempotency-Key was already used for a different request")
+
+            if created:
+                idempotency_requests.inc(route=route, outcome="new")
+                return IdempotentCall(self, (user_id, idempotency_key), entry)
+
+            try:
+                await asyncio.wait_for(entry.done.wait(), max(0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                idempotency_requests.inc(route=route, outcome="conflict")
+                raise HTTPException(409, detail="A request with this Idempotency-Key is still in progress")
+
+            # Request pertama gagal dan melepas key-nya, duplikat ini mengambil alih
+            if entry.result is None and entry.error is None:
+                continue
+
+            idempotency_requests.inc(route=route, outcome="replayed")
+            return IdempotentCall(self, (user_id, idempotency_key), entry, replayed=True)
+
+idempotency_store = IdempotencyStore()
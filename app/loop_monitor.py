@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+
+from metrics import Counter, Histogram
+
+LOOP_LAG_INTERVAL_MS = float(os.environ.get("LOOP_LAG_INTERVAL_MS", "100"))
+LOOP_LAG_THRESHOLD_MS = float(os.environ.get("LOOP_LAG_THRESHOLD_MS", "200"))
+
+APP_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+logger = logging.getLogger(__name__)
+
+event_loop_lag = Histogram("event_loop_lag_seconds", "Delay between the scheduled and actual wake-up of the event loop heartbeat", buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+event_loop_blocked = Counter("event_loop_blocked_total", "Times the event loop was blocked longer than the threshold", ("location",))
+event_loop_block_duration = Histogram("event_loop_block_duration_seconds", "Duration of event loop blocks longer than the threshold", ("location",))
+
+def _blocking_location(frame) -> str:
+    # Frame terdalam yang berasal dari kode aplikasi, bukan dari library
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+
+        if filename.startswith(APP_DIRECTORY) and filename != os.path.abspath(__file__):
+            return f"{os.path.relpath(filename, APP_DIRECTORY)}:{frame.f_code.co_name}"
+
+        frame = frame.f_back
+
+    return "unknown"
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_MS / 1000, threshold: float = LOOP_LAG_THRESHOLD_MS / 1000):
+        self.interval = interval
+        self.threshold = threshold
+
+        self._loop_thread_id = None
+        self._last_beat = time.monotonic()
+        self._heartbeat_task = None
+        self._watchdog = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        # Harus dipanggil dari dalam event loop (lifespan)
+        if self.interval <= 0:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopping.clear()
+
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="event-loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+        if self._watchdog:
+            self._stopping.set()
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _heartbeat(self):
+        while True:
+            scheduled = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+
+            now = time.monotonic()
+            event_loop_lag.observe(max(0.0, now - scheduled))
+            self._last_beat = now
+
+    def _watch(self):
+        blocked_since = None
+        location = None
+
+        while not self._stopping.wait(self.interval):
+            stalled = time.monotonic() - self._last_beat - self.interval
+
+            if stalled > self.threshold:
+                if blocked_since is None:
+                    blocked_since = self._last_beat + self.interval
+                    location = self._report_block(stalled)
+
+                continue
+
+            if blocked_since is not None:
+                # Heartbeat jalan lagi, total durasi block dicatat
+                event_loop_block_duration.observe(self._last_beat - blocked_since, location=location)
+                blocked_since = None
+
+    def _report_block(self, stalled: float) -> str:
+        frame = sys._current_frames().get(self._loop_thread_id)
+
+        if frame is None:
+            return "unknown"
+
+        location = _blocking_location(frame)
+        event_loop_blocked.inc(location=location)
+
+        logger.warning(
+            "Event loop blocked for %.0f ms in %s, stack of the loop thread:\n%s",
+            stalled * 1000,
+            location,
+            "".join(traceback.format_stack(frame))
+        )
+
+        return location
+
+loop_monitor = LoopLagMonitor()
@@ -1,61 +1,143 @@
+import io
 import uuid
 
-from typing import Annotated
+from typing import Annotated, Literal
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone, timedelta
 
-from fastapi import FastAPI, Depends, HTTPException, Form, UploadFile, File, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Depends, HTTPException, Form, UploadFile, File, Request, Query, Response, Header
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
-from sqlmodel import Session, select, desc
+from sqlmodel import Session, select, desc, or_, and_, func, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
 from pydantic import EmailStr
 from sqlalchemy.exc import IntegrityError
 
-from utility import upload_file_to_cloud_storage, download_file_from_google_cloud, get_cloud_storage_public_url, delete_file_on_cloud_storage, generate_random_name, extension_based_on_mime_type, generate_reset_password_email_content, generate_reset_password_form, generate_success_reset_password
-from utility import CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY, CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY
-from auth import encode_jwt, verify_password, generate_expire_time, hash_password, validate_jwt, generate_expire_datetime
-from database import get_session
-from model.model import AccessTokenPayload, UserData, UserDataWithoutPhoto, PricePredictInput
+from utility import spool_file_to_cloud_storage, download_file_from_google_cloud, get_cloud_storage_public_url, generate_random_name, extension_based_on_mime_type, generate_reset_password_email_content, generate_reset_password_form, generate_success_reset_password, create_upload_session_url, get_uploaded_file_size, open_uploaded_file, promote_uploaded_file, validate_image_file, encode_history_cursor, decode_history_cursor, generate_etag, format_http_date, is_not_modified
+from utility import CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY, CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY, UPLOAD_MAX_BYTES, UPLOAD_PENDING_PREFIX
+from cloud_storage import get_storage_gateway, LocalStorageBackend
+from auth import encode_jwt, generate_expire_time, validate_jwt, generate_expire_datetime, encode_upload_session, decode_upload_session, encode_reset_password_token, decode_reset_password_token, password_fingerprint, is_reset_password_token_current, UPLOAD_SESSION_EXPR_MINUTES, RESET_PASSWORD_EXPR_MINUTES, RESET_PASSWORD_TOKEN_MODE
+from database import get_session, get_read_session, get_async_session, warm_up_pool, replica_health_check, engine, async_engine, replica_engines
+from principal import CurrentUser, UserReadSessionDatabase, PrimaryPinned, pin_primary, user_cache
+from model.model import AccessTokenPayload, UserData, UserDataWithoutPhoto, PricePredictInput, UploadSessionPayload, ResetPasswordPayload
 from model.database_model import User, Forgot_Password, Motor, Motor_Image
-from model.form_model import LoginForm, UpdateForm, RegisterForm, UpdatePasswordForm, ResetPasswordForm, PricePredictForm
-from model.response_model import LoginSuccess, RegisterSuccess, UserDataSuccess, UpdatePhotoSuccess, UpdataDataSuccess, SuccessResponse, ErrorResponse, SelfValidationError, PricePredictSuccess, ImagePredictSuccess, PredictHistory, AllPredictHistory
-from email_handler import send_reset_password_email
+from model.form_model import LoginForm, UpdateForm, RegisterForm, UpdatePasswordForm, ResetPasswordForm, PricePredictForm, UploadSessionForm, FinalizeUploadForm, HistoryQuery
+from model.response_model import LoginSuccess, RegisterSuccess, UserDataSuccess, UpdatePhotoSuccess, UpdataDataSuccess, SuccessResponse, ErrorResponse, SelfValidationError, PricePredictSuccess, ImagePredictSuccess, PredictHistory, AllPredictHistory, UploadSessionSuccess
+from email_handler import send_reset_password_email, email_outbox, OutboxFull
 from predict import predict_uploaded_image, predict_motor_price
+from upload_queue import upload_queue
+from storage_sweeper import deletion_queue, orphan_reconciler, queue_file_deletion
+from metrics import render_prometheus
+from history_export import stream_history_export, EXPORT_MEDIA_TYPE
+from middleware import BodySizeLimitMiddleware
+from query_stats import QueryStatsMiddleware, instrument_engine, query_budget
+from request_metrics import RequestMetricsMiddleware
+from profiler import ProfilerMiddleware, PROFILER_SECRET, PROFILER_SAMPLE_RATE
+from loop_monitor import loop_monitor
+from token_sweeper import forgot_password_purger
+from password_hasher import password_hasher
+from rate_limit import login_throttle, forgot_password_throttle, reset_password_throttle
+from admission import RequestDeadline, image_model_gate, price_model_gate
+from idempotency import idempotency_store, form_fingerprint, upload_fingerprint
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_up_pool()
+    replica_health_check.start()
+    upload_queue.start()
+    deletion_queue.start()
+    orphan_reconciler.start()
+    forgot_password_purger.start()
+    email_outbox.start()
+    password_hasher.start()
+    loop_monitor.start()
+    yield
+    loop_monitor.stop()
+    password_hasher.stop()
+    email_outbox.stop()
+    forgot_password_purger.stop()
+    orphan_reconciler.stop()
+    deletion_queue.stop()
+    upload_queue.stop()
+    replica_health_check.stop()
 
 app = FastAPI(
     title="HonDealz API Documentation",
     description="Second-Hand Honda Motorcycle Price Prediction Application",
     version="1.2.0",
     docs_url=None,
-    redoc_url="/documentation"
+    redoc_url="/documentation",
+    lifespan=lifespan
 )
 
+# Ruang tambahan untuk field form dan boundary multipart
+app.add_middleware(BodySizeLimitMiddleware, max_body_size=UPLOAD_MAX_BYTES + 64 * 1024)
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
+
+if PROFILER_SECRET or PROFILER_SAMPLE_RATE > 0:
+    app.add_middleware(ProfilerMiddleware)
+
+for database_engine in [engine, async_engine.sync_engine, *replica_engines]:
+    instrument_engine(database_engine)
+
 app.mount("/assets", StaticFiles(directory="app/assets"), "assets")
 
+if isinstance(get_storage_gateway(), LocalStorageBackend):
+    app.mount("/local-storage", StaticFiles(directory=get_storage_gateway().root), "local-storage")
+
+    @app.put("/local-storage-upload/{bucket}/{key:path}", status_code=201, include_in_schema=False)
+    async def local_storage_upload(bucket: str, key: str, request: Request):
+        body = await request.body()
+
+        try:
+            await run_in_threadpool(get_storage_gateway().upload_file, io.BytesIO(body), key, bucket, request.headers.get("content-type"))
+        except FileExistsError:
+            raise HTTPException(412, detail="Object already exists")
+
 SessionDatabase = Annotated[Session, Depends(get_session)]
+ReadSessionDatabase = Annotated[Session, Depends(get_read_session)]
+AsyncSessionDatabase = Annotated[AsyncSession, Depends(get_async_session)]
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    return render_prometheus()
 
 @app.post(
     '/user/login',
     response_model=LoginSuccess,
+    dependencies=[Depends(login_throttle)],
     responses={
         401: {
             "model": ErrorResponse,
             "description": "Unauthorized"
         },
+        429: {
+            "model": ErrorResponse,
+            "description": "Too Many Requests"
+        },
         500: {
             "model": ErrorResponse,
             "description": "Internal Server Error"
+        },
+        503: {
+            "model": ErrorResponse,
+            "description": "Password hashing is saturated"
         }
     }
 )
-def login_user(form_data: Annotated[LoginForm, Form()], session: SessionDatabase):
+async def login_user(form_data: Annotated[LoginForm, Form()], session: AsyncSessionDatabase):
     try:
-        user = session.exec(select(User).where(User.email == form_data.email)).first()
+        user = (await session.exec(select(User).where(User.email == form_data.email))).first()
     except:
         raise HTTPException(500, detail="Internal Server Error")
     
-    if not user or not verify_password(form_data.password, user.password):
+    if not user or not await password_hasher.verify(form_data.password, user.password):
         raise HTTPException(401, detail="Login Failed")
     
+    user_cache.put(user)
+
     expire_time = generate_expire_time()
 
     payload = AccessTokenPayload(id=user.id, expr=expire_time)
@@ -71,6 +153,10 @@ def login_user(form_data: Annotated[LoginForm, Form()], session: SessionDatabase
             "model": ErrorResponse,
             "description": "User with the same data already registered"
         },
+        413: {
+            "model": ErrorResponse,
+            "description": "File Too Large"
+        },
         415: {
             "model": ErrorResponse,
             "description": "File Not Supported"
@@ -78,29 +164,40 @@ def login_user(form_data: Annotated[LoginForm, Form()], session: SessionDatabase
         500: {
             "model": ErrorResponse,
             "description": "Internal Server Error"
+        },
+        503: {
+            "model": ErrorResponse,
+            "description": "Password hashing is saturated"
         }
     }
 )
 async def registering_user(
         form_data: Annotated[RegisterForm, Form(), File()],
-        session: SessionDatabase
+        session: AsyncSessionDatabase
     ):
     random_filename = (generate_random_name(33) + extension_based_on_mime_type(form_data.photo_profile.content_type)) if form_data.photo_profile and form_data.photo_profile.size else None
 
-    new_user = User(email=form_data.email, password=hash_password(form_data.password), username=form_data.username, name=form_data.name, photo_profile=random_filename)
+    if random_filename:
+        await run_in_threadpool(validate_image_file, form_data.photo_profile.file, form_data.photo_profile.size)
+
+    hashed_password = await password_hasher.hash(form_data.password)
+
+    new_user = User(email=form_data.email, password=hashed_password, username=form_data.username, name=form_data.name, photo_profile=random_filename)
 
     try:
         session.add(new_user)
-        session.commit()
-        session.refresh(new_user)
+        await session.commit()
+        await session.refresh(new_user)
     except IntegrityError:
         raise HTTPException(400, detail="User with the same data already registered")
     # except:
     #     raise HTTPException(500, detail="Internal Server Error")
     
     if form_data.photo_profile and form_data.photo_profile.size:
-        upload_file_to_cloud_storage(form_data.photo_profile, random_filename, CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
+        await run_in_threadpool(spool_file_to_cloud_storage, form_data.photo_profile, random_filename, CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
     
+    user_cache.put(new_user)
+
     expire_time = generate_expire_time()
 
     payload = AccessTokenPayload(id=new_user.id, expr=expire_time)
@@ -121,6 +218,7 @@ async def registering_user(
 @app.post(
     "/user/forgot-password",
     response_model=SuccessResponse,
+    dependencies=[Depends(forgot_password_throttle)],
     responses={
         400: {
             "model": ErrorResponse,
@@ -130,9 +228,17 @@ async def registering_user(
             "model": ErrorResponse,
             "description": "Not Found"
         },
+        429: {
+            "model": ErrorResponse,
+            "description": "Too Many Requests"
+        },
         500: {
             "model": ErrorResponse,
             "description": "Internal Server Error"
+        },
+        503: {
+            "model": ErrorResponse,
+            "description": "Email outbox is full"
         }
     }
 )
@@ -144,25 +250,38 @@ def forgot_password(email: Annotated[EmailStr, Form()], session: SessionDatabase
 
     if not user:
         raise HTTPException(404, detail="Unknown Email")
-    
-    interval_10_minutes = datetime.now(timezone.utc) - timedelta(minutes=10)
 
-    try:
-        latest_fp_token = session.exec(select(Forgot_Password).where(Forgot_Password.user_id == user.id).where(Forgot_Password.expire > interval_10_minutes)).first()
-    except:
-        raise HTTPException(500, detail="Internal Server Error")
-    
-    if latest_fp_token:
-        raise HTTPException(400, detail="Recently you have requested a password reset, if you want to request it again, please wait 10 minutes")
-    
-    fp_token = Forgot_Password(uuid=uuid.uuid4(), user=user, expire=generate_expire_datetime())
+    if RESET_PASSWORD_TOKEN_MODE == "signed":
+        if email_outbox.is_full():
+            raise HTTPException(503, detail="Service Unavailable, please try again later", headers={"Retry-After": "30"})
 
-    try:
-        session.add(fp_token)
-        session.commit()
-        session.refresh(fp_token)
-    except:
-        raise HTTPException(500, detail="Internal Server Error")
+        # Tidak ada row yang disimpan, permintaan berulang dibatasi oleh forgot_password_throttle
+        reset_token = encode_reset_password_token(ResetPasswordPayload(id=user.id, fingerprint=password_fingerprint(user.password), expr=generate_expire_time(RESET_PASSWORD_EXPR_MINUTES)))
+    else:
+        interval_10_minutes = datetime.now(timezone.utc) - timedelta(minutes=10)
+
+        try:
+            latest_fp_token = session.exec(select(Forgot_Password).where(Forgot_Password.user_id == user.id).where(Forgot_Password.expire > interval_10_minutes)).first()
+        except:
+            raise HTTPException(500, detail="Internal Server Error")
+        
+        if latest_fp_token:
+            raise HTTPException(400, detail="Recently you have requested a password reset, if you want to request it again, please wait 10 minutes")
+
+        # Dicek sebelum token dibuat, supaya user tidak terkena jeda 10 menit untuk email yang tidak terkirim
+        if email_outbox.is_full():
+            raise HTTPException(503, detail="Service Unavailable, please try again later", headers={"Retry-After": "30"})
+        
+        fp_token = Forgot_Password(uuid=uuid.uuid4(), user=user, expire=generate_expire_datetime())
+
+        try:
+            session.add(fp_token)
+            session.commit()
+            session.refresh(fp_token)
+        except:
+            raise HTTPException(500, detail="Internal Server Error")
+
+        reset_token = fp_token.uuid
     
     url_origin = f"{request.url.scheme}://{request.url.hostname}"
 
@@ -170,8 +289,10 @@ def forgot_password(email: Annotated[EmailStr, Form()], session: SessionDatabase
         url_origin = url_origin + f":{request.url.port}"
 
     try:
-        send_reset_password_email(user.email, generate_reset_password_email_content(url_origin, fp_token.uuid))
+        send_reset_password_email(user.email, generate_reset_password_email_content(url_origin, reset_token))
         return SuccessResponse(message="Success, please check your email to reset your password")
+    except OutboxFull:
+        raise HTTPException(503, detail="Service Unavailable, please try again later", headers={"Retry-After": "30"})
     except:
         raise HTTPException(500, detail="Internal Server Error")
 
@@ -193,15 +314,8 @@ def forgot_password(email: Annotated[EmailStr, Form()], session: SessionDatabase
         }
     }
 )
-def get_user_data(payload: Annotated[AccessTokenPayload, Depends(validate_jwt)], session: SessionDatabase):
-    try:
-        user = session.get(User, payload.id)
-    except:
-        raise HTTPException(500, detail="Internal Server Error")
-
-    if not user:
-        raise HTTPException(401, detail="User Unknown")
-
+@query_budget(1)
+def get_user_data(user: CurrentUser):
     data_user = UserData(
         email=user.email,
         username=user.username,
@@ -226,19 +340,23 @@ def get_user_data(payload: Annotated[AccessTokenPayload, Depends(validate_jwt)],
         500: {
             "model": ErrorResponse,
             "description": "Internal Server Error"
+        },
+        503: {
+            "model": ErrorResponse,
+            "description": "Password hashing is saturated"
         }
     }
 )
-def update_user_password(payload: Annotated[AccessTokenPayload, Depends(validate_jwt)], form_data: Annotated[UpdatePasswordForm, Form()], session: SessionDatabase):
+async def update_user_password(payload: Annotated[AccessTokenPayload, Depends(validate_jwt)], form_data: Annotated[UpdatePasswordForm, Form()], session: AsyncSessionDatabase):
     try:
-        user = session.get(User, payload.id)
+        user = await session.get(User, payload.id)
     except:
         raise HTTPException(500, detail="Internal Server Error")
 
     if not user:
         raise HTTPException(401, detail="User Unknown")
     
-    if not verify_password(form_data.old_password, user.password):
+    if not await password_hasher.verify(form_data.old_password, user.password):
         raise HTTPException(403, detail="Change password failed")
     
     if form_data.new_password == form_data.old_password:
@@ -247,14 +365,15 @@ def update_user_password(payload: Annotated[AccessTokenPayload, Depends(validate
     if form_data.new_password == user.email:
         raise HTTPException(422, detail=[SelfValidationError(loc=["body", "new_password"], msg="Password cannot be the same as the email", input=form_data.new_password).model_dump()])
     
-    user.password = hash_password(form_data.new_password)
+    user.password = await password_hasher.hash(form_data.new_password)
 
     try:
         session.add(user)
-        session.commit()
-        session.refresh(user)
+        await session.commit()
     except:
         raise HTTPException(500, detail="Internal Server Error")
+
+    user_cache.invalidate(user.id)
     
     return SuccessResponse(message="Password updated")
 
@@ -270,6 +389,10 @@ def update_user_password(payload: Annotated[AccessTokenPayload, Depends(validate
             "model": ErrorResponse,
             "description": "Forbidden"
         },
+        413: {
+            "model": ErrorResponse,
+            "description": "File Too Large"
+        },
         415: {
             "model": ErrorResponse,
             "description": "File Not Supported",
@@ -293,6 +416,9 @@ def update_user_photo_profile(payload: Annotated[AccessTokenPayload, Depends(val
         raise HTTPException(415, detail="No File Uploaded")
     
     random_filename = generate_random_name(33) + extension_based_on_mime_type(photo_profile.content_type)
+
+    validate_image_file(photo_profile.file, photo_profile.size)
+
     old_filename = user.photo_profile
 
     user.photo_profile = random_filename
@@ -304,10 +430,154 @@ def update_user_photo_profile(payload: Annotated[AccessTokenPayload, Depends(val
     except:
         raise HTTPException(500, detail="Internal Server Error")
 
-    if user.photo_profile:
-        delete_file_on_cloud_storage(old_filename, CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
+    user_cache.invalidate(user.id)
+
+    if old_filename:
+        queue_file_deletion([old_filename], CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
     
-    upload_file_to_cloud_storage(photo_profile, random_filename, CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
+    spool_file_to_cloud_storage(photo_profile, random_filename, CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
+
+    return UpdatePhotoSuccess(photo_profile=get_cloud_storage_public_url(user.photo_profile, CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY))
+
+@app.post(
+    "/user/photo-profile/upload-session",
+    response_model=UploadSessionSuccess,
+    responses={
+        401: {
+            "model": ErrorResponse,
+            "description": "Unauthorized"
+        },
+        403: {
+            "model": ErrorResponse,
+            "description": "Forbidden"
+        },
+        413: {
+            "model": ErrorResponse,
+            "description": "File Too Large"
+        },
+        500: {
+            "model": ErrorResponse,
+            "description": "Internal Server Error"
+        }
+    }
+)
+def create_photo_profile_upload_session(user: CurrentUser, form_data: Annotated[UploadSessionForm, Form()]):
+    if form_data.size > UPLOAD_MAX_BYTES:
+        raise HTTPException(413, detail="File too large")
+
+    random_filename = generate_random_name(33) + extension_based_on_mime_type(form_data.content_type)
+
+    try:
+        upload_url = create_upload_session_url(random_filename, CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY, form_data.content_type, form_data.size)
+    except:
+        raise HTTPException(500, detail="Internal Server Error")
+
+    expire_time = generate_expire_time(UPLOAD_SESSION_EXPR_MINUTES)
+
+    upload_session = UploadSessionPayload(id=user.id, purpose="photo_profile", filename=random_filename, content_type=form_data.content_type, size=form_data.size, expr=expire_time)
+
+    return UploadSessionSuccess(upload_url=upload_url, upload_id=encode_upload_session(upload_session), expire=expire_time)
+
+@app.post(
+    "/user/photo-profile/finalize",
+    response_model=UpdatePhotoSuccess,
+    responses={
+        400: {
+            "model": ErrorResponse,
+            "description": "Invalid or expired upload session"
+        },
+        401: {
+            "model": ErrorResponse,
+            "description": "Unauthorized"
+        },
+        403: {
+            "model": ErrorResponse,
+            "description": "Forbidden"
+        },
+        404: {
+            "model": ErrorResponse,
+            "description": "Uploaded file not found"
+        },
+        413: {
+            "model": ErrorResponse,
+            "description": "File Too Large"
+        },
+        415: {
+            "model": ErrorResponse,
+            "description": "File Not Supported",
+        },
+        500: {
+            "model": ErrorResponse,
+            "description": "Internal Server Error"
+        }
+    }
+)
+def finalize_photo_profile_upload(payload: Annotated[AccessTokenPayload, Depends(validate_jwt)], form_data: Annotated[FinalizeUploadForm, Form()], session: SessionDatabase):
+    upload_session = decode_upload_session(form_data.upload_id, payload.id, "photo_profile")
+
+    try:
+        user = session.get(User, payload.id)
+    except:
+        raise HTTPException(500, detail="Internal Server Error")
+
+    if not user:
+        raise HTTPException(401, detail="User Unknown")
+
+    if user.photo_profile == upload_session.filename:
+        return UpdatePhotoSuccess(photo_profile=get_cloud_storage_public_url(user.photo_profile, CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY))
+
+    try:
+        file_size = get_uploaded_file_size(upload_session.filename, CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
+    except:
+        raise HTTPException(500, detail="Internal Server Error")
+
+    if file_size is None:
+        raise HTTPException(404, detail="Uploaded file not found")
+
+    if not file_size:
+        raise HTTPException(415, detail="No File Uploaded")
+
+    if file_size > UPLOAD_MAX_BYTES:
+        queue_file_deletion([upload_session.filename], UPLOAD_PENDING_PREFIX + CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
+        raise HTTPException(413, detail="File too large")
+
+    if file_size != upload_session.size:
+        queue_file_deletion([upload_session.filename], UPLOAD_PENDING_PREFIX + CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
+        raise HTTPException(400, detail="Uploaded file size does not match the upload session")
+
+    try:
+        photo = open_uploaded_file(upload_session.filename, CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
+    except:
+        raise HTTPException(500, detail="Internal Server Error")
+
+    with photo:
+        try:
+            validate_image_file(photo)
+        except HTTPException:
+            queue_file_deletion([upload_session.filename], UPLOAD_PENDING_PREFIX + CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
+            raise
+
+    # Dipindahkan dari prefix pending supaya tidak ikut disapu reconciler
+    try:
+        promote_uploaded_file(upload_session.filename, CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
+    except:
+        raise HTTPException(500, detail="Internal Server Error")
+
+    old_filename = user.photo_profile
+
+    user.photo_profile = upload_session.filename
+
+    try:
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+    except:
+        raise HTTPException(500, detail="Internal Server Error")
+
+    user_cache.invalidate(user.id)
+
+    if old_filename:
+        queue_file_deletion([old_filename], CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
 
     return UpdatePhotoSuccess(photo_profile=get_cloud_storage_public_url(user.photo_profile, CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY))
 
@@ -354,8 +624,10 @@ def delete_user_photo_profile(payload: Annotated[AccessTokenPayload, Depends(val
         session.refresh(user)
     except:
         raise HTTPException(500, detail="Internal Server Error")
+
+    user_cache.invalidate(user.id)
     
-    delete_file_on_cloud_storage(old_filename, CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
+    queue_file_deletion([old_filename], CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
 
     return SuccessResponse(message="Photo Profile Successfully Deleted")
 
@@ -414,6 +686,8 @@ def update_user_data(payload: Annotated[AccessTokenPayload, Depends(validate_jwt
         except:
             raise HTTPException(500, detail="Internal Server Error")
 
+        user_cache.invalidate(user.id)
+
         data_user = UserDataWithoutPhoto(email=user.email, username=user.username, name=user.name)
 
         return UpdataDataSuccess(user=data_user)
@@ -448,13 +722,18 @@ def delete_user_account(payload: Annotated[AccessTokenPayload, Depends(validate_
         raise HTTPException(401, detail="User Unknown")
     
     try:
+        motor_image_filenames = session.exec(select(Motor_Image.filename).where(Motor_Image.user_id == user.id)).all()
         session.delete(user)
         session.commit()
     except:
         raise HTTPException(500, detail="Internal Server Error")
+
+    user_cache.invalidate(user.id)
     
     if user.photo_profile:
-        delete_file_on_cloud_storage(user.photo_profile, CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
+        queue_file_deletion([user.photo_profile], CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY)
+
+    queue_file_deletion(motor_image_filenames, CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY)
 
     return SuccessResponse(message=f"{user.username} account has been deleted")
 
@@ -463,9 +742,22 @@ def get_method_reset_password():
     raise HTTPException(404)
 
 @app.get("/reset-password/{uuid}", response_class=HTMLResponse, include_in_schema=False)
-def reset_password_page(uuid: str, session: SessionDatabase):
+@query_budget(3)
+def reset_password_page(uuid: str, session: ReadSessionDatabase):
+    # Token signed diverifikasi tanpa query, fingerprint password dicek saat form dikirim
+    if RESET_PASSWORD_TOKEN_MODE == "signed":
+        if not decode_reset_password_token(uuid):
+            raise HTTPException(404)
+
+        return generate_reset_password_form(uuid)
+
     try:
         fp_token = session.get(Forgot_Password, uuid)
+
+        # Token yang baru dibuat mungkin belum sampai ke replica
+        if not fp_token and not session.info["use_primary"]:
+            session.info["use_primary"] = True
+            fp_token = session.get(Forgot_Password, uuid)
     except:
         raise HTTPException(500, detail="Internal Server Error")
 
@@ -486,36 +778,67 @@ def reset_password_page(uuid: str, session: SessionDatabase):
 
     return html_content
 
-@app.post("/reset-password", response_class=HTMLResponse, include_in_schema=False)
-def reset_password_handler(form_data: Annotated[ResetPasswordForm, Form()], session: SessionDatabase):
+@app.post("/reset-password", response_class=HTMLResponse, include_in_schema=False, dependencies=[Depends(reset_password_throttle)])
+@query_budget(3)
+async def reset_password_handler(form_data: Annotated[ResetPasswordForm, Form()], session: AsyncSessionDatabase):
+    if RESET_PASSWORD_TOKEN_MODE == "signed":
+        return await reset_password_with_signed_token(form_data, session)
+
+    # Token dan user diambil dalam satu query, tanpa lazy load fp_token.user
     try:
-        fp_token = session.get(Forgot_Password, form_data.token)
-        all_fp_token = session.exec(select(Forgot_Password).where(Forgot_Password.user_id == fp_token.user_id)).all()
+        result = (await session.exec(select(Forgot_Password, User).join(User).where(Forgot_Password.uuid == form_data.token))).first()
     except:
         raise HTTPException(500, detail="Internal Server Error")
 
-    if not fp_token:
+    if not result:
         raise HTTPException(401, detail="Unauthorized")
     
+    fp_token, user = result
+    
+    if form_data.password == user.email:
+        raise HTTPException(422, detail=[SelfValidationError(loc=["body", "password"], msg="Password cannot be the same as the email", input=form_data.password).model_dump()])
+    
+    user.password = await password_hasher.hash(form_data.password)
+
     try:
-        user = fp_token.user
+        await session.exec(delete(Forgot_Password).where(Forgot_Password.user_id == user.id))
+        session.add(user)
+        await session.commit()
     except:
         raise HTTPException(500, detail="Internal Server Error")
+
+    user_cache.invalidate(user.id)
     
+    return generate_success_reset_password()
+
+async def reset_password_with_signed_token(form_data: ResetPasswordForm, session: AsyncSession):
+    payload = decode_reset_password_token(form_data.token)
+
+    if not payload:
+        raise HTTPException(401, detail="Unauthorized")
+
+    try:
+        user = await session.get(User, payload.id)
+    except:
+        raise HTTPException(500, detail="Internal Server Error")
+
+    # Password sudah diganti sejak token dibuat, token dianggap sudah terpakai
+    if not user or not is_reset_password_token_current(payload, user.password):
+        raise HTTPException(401, detail="Unauthorized")
+
     if form_data.password == user.email:
         raise HTTPException(422, detail=[SelfValidationError(loc=["body", "password"], msg="Password cannot be the same as the email", input=form_data.password).model_dump()])
-    
-    user.password = hash_password(form_data.password)
+
+    user.password = await password_hasher.hash(form_data.password)
 
     try:
-        for token in all_fp_token:
-            session.delete(token)
         session.add(user)
-        session.commit()
-        session.refresh(user)
+        await session.commit()
     except:
         raise HTTPException(500, detail="Internal Server Error")
-    
+
+    user_cache.invalidate(user.id)
+
     return generate_success_reset_password()
 
 @app.post(
@@ -534,6 +857,133 @@ def reset_password_handler(form_data: Annotated[ResetPasswordForm, Form()], sess
             "model": ErrorResponse,
             "description": "Forbidden"
         },
+        413: {
+            "model": ErrorResponse,
+            "description": "File Too Large"
+        },
+        415: {
+            "model": ErrorResponse,
+            "description": "File Not Supported",
+        },
+        409: {
+            "model": ErrorResponse,
+            "description": "A request with the same Idempotency-Key is still in progress"
+        },
+        500: {
+            "model": ErrorResponse,
+            "description": "Internal Server Error"
+        },
+        503: {
+            "model": ErrorResponse,
+            "description": "Model busy or request deadline exceeded"
+        }
+    }
+)
+@query_budget(3)
+async def motor_image_recognition(user: CurrentUser, photo: Annotated[UploadFile, File()], session: AsyncSessionDatabase, deadline: RequestDeadline, response: Response, idempotency_key: Annotated[str | None, Header(max_length=255)] = None):
+    fingerprint = await run_in_threadpool(upload_fingerprint, photo.file) if idempotency_key else None
+    call = await idempotency_store.claim(user.id, idempotency_key, "motor-image-recognition", fingerprint)
+
+    if call.replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+        return call.replay()
+
+    with call:
+        if not photo.size:
+            raise HTTPException(415, detail="No File Uploaded")
+
+        random_filename = generate_random_name(33) + extension_based_on_mime_type(photo.content_type)
+
+        # Header dicek dulu, file tidak dibaca seluruhnya ke memori
+        await run_in_threadpool(validate_image_file, photo.file, photo.size)
+
+        predict_result = await image_model_gate.run(user.id, deadline, predict_uploaded_image, photo.file)
+
+        if predict_result["status"] == "success":
+            # Relationship tidak di-assign langsung agar tidak ada lazy load di AsyncSession
+            motor_image = Motor_Image(user_id=user.id, filename=random_filename, model_prediction=predict_result["model"], created_at=datetime.now(timezone.utc))
+
+            try:
+                session.add(motor_image)
+                await session.commit()
+                await session.refresh(motor_image)
+            except:
+                raise HTTPException(500, detail="Internal Server Error")
+        
+            await run_in_threadpool(spool_file_to_cloud_storage, photo, random_filename, CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY)
+
+            return call.complete(ImagePredictSuccess(id_picture=motor_image.id, model=motor_image.model_prediction, created_at=datetime.now(timezone.utc)))
+        else:
+            raise HTTPException(400, detail=predict_result["message"])
+
+
+@app.post(
+    "/ai-models/motor-image-recognition/upload-session",
+    response_model=UploadSessionSuccess,
+    responses={
+        401: {
+            "model": ErrorResponse,
+            "description": "Unauthorized"
+        },
+        403: {
+            "model": ErrorResponse,
+            "description": "Forbidden"
+        },
+        413: {
+            "model": ErrorResponse,
+            "description": "File Too Large"
+        },
+        500: {
+            "model": ErrorResponse,
+            "description": "Internal Server Error"
+        }
+    }
+)
+def create_motor_image_upload_session(user: CurrentUser, form_data: Annotated[UploadSessionForm, Form()]):
+    if form_data.size > UPLOAD_MAX_BYTES:
+        raise HTTPException(413, detail="File too large")
+
+    random_filename = generate_random_name(33) + extension_based_on_mime_type(form_data.content_type)
+
+    try:
+        upload_url = create_upload_session_url(random_filename, CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY, form_data.content_type, form_data.size)
+    except:
+        raise HTTPException(500, detail="Internal Server Error")
+
+    expire_time = generate_expire_time(UPLOAD_SESSION_EXPR_MINUTES)
+
+    upload_session = UploadSessionPayload(id=user.id, purpose="motor_image", filename=random_filename, content_type=form_data.content_type, size=form_data.size, expr=expire_time)
+
+    return UploadSessionSuccess(upload_url=upload_url, upload_id=encode_upload_session(upload_session), expire=expire_time)
+
+@app.post(
+    "/ai-models/motor-image-recognition/finalize",
+    response_model=ImagePredictSuccess,
+    responses={
+        400: {
+            "model": ErrorResponse,
+            "description": "Prediction failed or invalid upload session"
+        },
+        401: {
+            "model": ErrorResponse,
+            "description": "Unauthorized"
+        },
+        403: {
+            "model": ErrorResponse,
+            "description": "Forbidden"
+        },
+        404: {
+            "model": ErrorResponse,
+            "description": "Uploaded file not found"
+        },
+        409: {
+            "model": ErrorResponse,
+            "description": "Upload already finalized"
+        },
+        413: {
+            "model": ErrorResponse,
+            "description": "File Too Large"
+        },
         415: {
             "model": ErrorResponse,
             "description": "File Not Supported",
@@ -541,45 +991,82 @@ def reset_password_handler(form_data: Annotated[ResetPasswordForm, Form()], sess
         500: {
             "model": ErrorResponse,
             "description": "Internal Server Error"
+        },
+        503: {
+            "model": ErrorResponse,
+            "description": "Model busy or request deadline exceeded"
         }
     }
 )
-async def motor_image_recognition(payload: Annotated[AccessTokenPayload, Depends(validate_jwt)], photo: Annotated[UploadFile, File()], session: SessionDatabase):
+async def finalize_motor_image_upload(user: CurrentUser, form_data: Annotated[FinalizeUploadForm, Form()], session: AsyncSessionDatabase, deadline: RequestDeadline):
+    upload_session = decode_upload_session(form_data.upload_id, user.id, "motor_image")
+
     try:
-        user = session.get(User, payload.id)
+        file_size = await run_in_threadpool(get_uploaded_file_size, upload_session.filename, CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY)
     except:
         raise HTTPException(500, detail="Internal Server Error")
 
-    if not user:
-        raise HTTPException(401, detail="User Unknown")
-    
-    if not photo.size:
+    if file_size is None:
+        # Object sudah dipindahkan dari prefix pending oleh finalize sebelumnya
+        try:
+            finalized = (await session.exec(select(Motor_Image.id).where(Motor_Image.filename == upload_session.filename))).first()
+        except:
+            raise HTTPException(500, detail="Internal Server Error")
+
+        if finalized is not None:
+            raise HTTPException(409, detail="Upload already finalized")
+
+        raise HTTPException(404, detail="Uploaded file not found")
+
+    if not file_size:
         raise HTTPException(415, detail="No File Uploaded")
-    
-    photo_bytes = await photo.read()
 
-    predict_result = predict_uploaded_image(photo_bytes)
+    if file_size > UPLOAD_MAX_BYTES:
+        queue_file_deletion([upload_session.filename], UPLOAD_PENDING_PREFIX + CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY)
+        raise HTTPException(413, detail="File too large")
+
+    if file_size != upload_session.size:
+        queue_file_deletion([upload_session.filename], UPLOAD_PENDING_PREFIX + CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY)
+        raise HTTPException(400, detail="Uploaded file size does not match the upload session")
+
+    try:
+        photo = await run_in_threadpool(open_uploaded_file, upload_session.filename, CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY)
+    except:
+        raise HTTPException(500, detail="Internal Server Error")
+
+    try:
+        try:
+            await run_in_threadpool(validate_image_file, photo)
+        except HTTPException:
+            queue_file_deletion([upload_session.filename], UPLOAD_PENDING_PREFIX + CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY)
+            raise
+
+        predict_result = await image_model_gate.run(user.id, deadline, predict_uploaded_image, photo)
+    finally:
+        await run_in_threadpool(photo.close)
 
     if predict_result["status"] == "success":
-        random_filename = generate_random_name(33) + extension_based_on_mime_type(photo.content_type)
+        try:
+            await run_in_threadpool(promote_uploaded_file, upload_session.filename, CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY)
+        except:
+            raise HTTPException(500, detail="Internal Server Error")
 
-        motor_image = Motor_Image(user=user, filename=random_filename, model_prediction=predict_result["model"], created_at=datetime.now(timezone.utc))
+        motor_image = Motor_Image(user_id=user.id, filename=upload_session.filename, model_prediction=predict_result["model"], created_at=datetime.now(timezone.utc))
 
         try:
             session.add(motor_image)
-            session.commit()
-            session.refresh(motor_image)
+            await session.commit()
+            await session.refresh(motor_image)
+        except IntegrityError:
+            raise HTTPException(409, detail="Upload already finalized")
         except:
             raise HTTPException(500, detail="Internal Server Error")
-        
-        await photo.seek(0)
-        upload_file_to_cloud_storage(photo, random_filename, CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY)
 
-        return ImagePredictSuccess(id_picture=motor_image.id, model=motor_image.model_prediction, created_at=datetime.now(timezone.utc))
+        return ImagePredictSuccess(id_picture=motor_image.id, model=motor_image.model_prediction, created_at=motor_image.created_at)
     else:
+        queue_file_deletion([upload_session.filename], UPLOAD_PENDING_PREFIX + CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY)
         raise HTTPException(400, detail=predict_result["message"])
 
-
 @app.post(
     "/ai-models/motor-price-estimator",
     response_model=PricePredictSuccess,
@@ -596,49 +1083,71 @@ async def motor_image_recognition(payload: Annotated[AccessTokenPayload, Depends
             "model": ErrorResponse,
             "description": "Forbidden"
         },
+        409: {
+            "model": ErrorResponse,
+            "description": "A request with the same Idempotency-Key is still in progress"
+        },
         500: {
             "model": ErrorResponse,
             "description": "Internal Server Error"
+        },
+        503: {
+            "model": ErrorResponse,
+            "description": "Model busy or request deadline exceeded"
         }
     }
 )
-def motor_price_estimator(payload: Annotated[AccessTokenPayload, Depends(validate_jwt)], form_data: Annotated[PricePredictForm, Form()], session: SessionDatabase):
-    try:
-        user = session.get(User, payload.id)
-        motor_image = None
-        if form_data.id_picture != None:
-            motor_image = session.get(Motor_Image, form_data.id_picture)
-    except:
-        raise HTTPException(500, detail="Internal Server Error")
-
-    if not user:
-        raise HTTPException(401, detail="User Unknown")
-    
-    price_predict_input = PricePredictInput(model=form_data.model, year=form_data.year, mileage=form_data.mileage, location=form_data.location, tax=form_data.tax)
-
-    predict_result = predict_motor_price(price_predict_input)
-
-    if predict_result["status"] == "success":
-        motor = Motor(user=user, model=form_data.model, year=form_data.year, mileage=form_data.mileage, location=form_data.location, tax=form_data.tax, predicted_price=predict_result["predictions"]["final"], min_price=predict_result["predictions"]["price_range"]["lower"], max_price=predict_result["predictions"]["price_range"]["upper"], created_at=datetime.now(timezone.utc))
+@query_budget(4)
+async def motor_price_estimator(user: CurrentUser, form_data: Annotated[PricePredictForm, Form()], session: AsyncSessionDatabase, deadline: RequestDeadline, response: Response, idempotency_key: Annotated[str | None, Header(max_length=255)] = None):
+    call = await idempotency_store.claim(user.id, idempotency_key, "motor-price-estimator", form_fingerprint(form_data))
 
-        if motor_image:
-            motor.motor_image = motor_image
+    if call.replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+        return call.replay()
 
+    with call:
         try:
-            session.add(motor)
-            session.commit()
-            session.refresh(motor)
+            motor_image = None
+            if form_data.id_picture != None:
+                motor_image = await session.get(Motor_Image, form_data.id_picture)
         except:
             raise HTTPException(500, detail="Internal Server Error")
 
-        return PricePredictSuccess(min_price=motor.min_price, predicted_price=motor.predicted_price, max_price=motor.max_price)
-    else:
-        raise HTTPException(400, detail=predict_result["message"])
+        price_predict_input = PricePredictInput(model=form_data.model, year=form_data.year, mileage=form_data.mileage, location=form_data.location, tax=form_data.tax)
+
+        predict_result = await price_model_gate.run(user.id, deadline, predict_motor_price, price_predict_input)
+
+        if predict_result["status"] == "success":
+            motor = Motor(user_id=user.id, model=form_data.model, year=form_data.year, mileage=form_data.mileage, location=form_data.location, tax=form_data.tax, predicted_price=predict_result["predictions"]["final"], min_price=predict_result["predictions"]["price_range"]["lower"], max_price=predict_result["predictions"]["price_range"]["upper"], created_at=datetime.now(timezone.utc))
+
+            # Relationship tidak di-assign langsung agar tidak ada lazy load di AsyncSession
+            if motor_image:
+                motor.motor_image_id = motor_image.id
+
+            try:
+                session.add(motor)
+                await session.commit()
+                await session.refresh(motor)
+            except:
+                raise HTTPException(500, detail="Internal Server Error")
+
+            pin_primary(response)
+
+            return call.complete(PricePredictSuccess(min_price=motor.min_price, predicted_price=motor.predicted_price, max_price=motor.max_price))
+        else:
+            raise HTTPException(400, detail=predict_result["message"])
 
 @app.get(
     "/histories",
     response_model=AllPredictHistory,
     responses={
+        304: {
+            "description": "Not Modified"
+        },
+        400: {
+            "model": ErrorResponse,
+            "description": "Invalid cursor"
+        },
         401: {
             "model": ErrorResponse,
             "description": "Unauthorized"
@@ -653,19 +1162,67 @@ def motor_price_estimator(payload: Annotated[AccessTokenPayload, Depends(validat
         }
     }
 )
-def list_all_histories(payload: Annotated[AccessTokenPayload, Depends(validate_jwt)], session: SessionDatabase):
+@query_budget(3)
+def list_all_histories(
+        user: CurrentUser,
+        query_params: Annotated[HistoryQuery, Query()],
+        request: Request,
+        response: Response,
+        session: UserReadSessionDatabase,
+        if_none_match: Annotated[str | None, Header()] = None,
+        if_modified_since: Annotated[str | None, Header()] = None
+    ):
+    # Row Motor tidak pernah diubah, jadi jumlah dan created_at terbaru cukup sebagai versi history user
     try:
-        user = session.get(User, payload.id)
+        history_count, last_modified = session.exec(select(func.count(Motor.id), func.max(Motor.created_at)).where(Motor.user_id == user.id)).one()
     except:
         raise HTTPException(500, detail="Internal Server Error")
 
-    if not user:
-        raise HTTPException(401, detail="User Unknown")
+    etag = generate_etag("histories", user.id, history_count, last_modified, request.url.query)
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if last_modified:
+        cache_headers["Last-Modified"] = format_http_date(last_modified)
+
+    if is_not_modified(if_none_match, if_modified_since, etag, last_modified):
+        return Response(status_code=304, headers=cache_headers)
+
+    response.headers.update(cache_headers)
+
+    statement = select(Motor, Motor_Image).join(Motor_Image).where(Motor.user_id == user.id)
+
+    if query_params.cursor:
+        cursor_created_at, cursor_id = decode_history_cursor(query_params.cursor)
+        statement = statement.where(or_(Motor.created_at < cursor_created_at, and_(Motor.created_at == cursor_created_at, Motor.id < cursor_id)))
+
+    if query_params.model:
+        statement = statement.where(Motor.model == query_params.model)
+
+    if query_params.year_min is not None:
+        statement = statement.where(Motor.year >= query_params.year_min)
+
+    if query_params.year_max is not None:
+        statement = statement.where(Motor.year <= query_params.year_max)
+
+    if query_params.price_min is not None:
+        statement = statement.where(Motor.predicted_price >= query_params.price_min)
+
+    if query_params.price_max is not None:
+        statement = statement.where(Motor.predicted_price <= query_params.price_max)
+
+    # Ambil satu baris lebih untuk mengetahui apakah masih ada halaman berikutnya
+    statement = statement.order_by(desc(Motor.created_at), desc(Motor.id)).limit(query_params.limit + 1)
 
     try:
-        query = session.exec(select(Motor, Motor_Image).join(Motor_Image).where(Motor.user_id == user.id))
+        query = session.exec(statement).all()
     except:
         raise HTTPException(500, detail="Internal Server Error")
+
+    next_cursor = None
+
+    if len(query) > query_params.limit:
+        query = query[:query_params.limit]
+        next_cursor = encode_history_cursor(query[-1][0].created_at, query[-1][0].id)
     
     histories = []
     for motor, motor_image in query:
@@ -683,12 +1240,47 @@ def list_all_histories(payload: Annotated[AccessTokenPayload, Depends(validate_j
             created_at=motor.created_at
         ))
     
-    return AllPredictHistory(histories=histories)
+    return AllPredictHistory(histories=histories, next_cursor=next_cursor)
+
+@app.get(
+    "/histories/export",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {
+                "text/csv": {},
+                "application/x-ndjson": {}
+            },
+            "description": "Full prediction history as CSV or NDJSON"
+        },
+        401: {
+            "model": ErrorResponse,
+            "description": "Unauthorized"
+        },
+        403: {
+            "model": ErrorResponse,
+            "description": "Forbidden"
+        },
+        500: {
+            "model": ErrorResponse,
+            "description": "Internal Server Error"
+        }
+    }
+)
+def export_histories(user: CurrentUser, use_primary: PrimaryPinned, format: Annotated[Literal["csv", "ndjson"], Query()] = "csv"):
+    return StreamingResponse(
+        stream_history_export(user.id, format, use_primary),
+        media_type=EXPORT_MEDIA_TYPE[format],
+        headers={"Content-Disposition": f'attachment; filename="histories.{format}"'}
+    )
 
 @app.get(
     "/history/{id}",
     response_model=PredictHistory,
     responses={
+        304: {
+            "description": "Not Modified"
+        },
         401: {
             "model": ErrorResponse,
             "description": "Unauthorized"
@@ -707,24 +1299,43 @@ def list_all_histories(payload: Annotated[AccessTokenPayload, Depends(validate_j
         }
     }
 )
-def get_spesific_history(id: int, payload: Annotated[AccessTokenPayload, Depends(validate_jwt)], session: SessionDatabase):
+@query_budget(3)
+def get_spesific_history(
+        id: int,
+        user: CurrentUser,
+        response: Response,
+        session: UserReadSessionDatabase,
+        if_none_match: Annotated[str | None, Header()] = None,
+        if_modified_since: Annotated[str | None, Header()] = None
+    ):
     try:
-        user = session.get(User, payload.id)
+        history_count, last_modified = session.exec(select(func.count(Motor.id), func.max(Motor.created_at)).where(Motor.user_id == user.id)).one()
     except:
         raise HTTPException(500, detail="Internal Server Error")
 
-    if not user:
-        raise HTTPException(401, detail="User Unknown")
-    
+    etag = generate_etag("history", user.id, history_count, last_modified, id)
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if last_modified:
+        cache_headers["Last-Modified"] = format_http_date(last_modified)
+
+    if is_not_modified(if_none_match, if_modified_since, etag, last_modified):
+        return Response(status_code=304, headers=cache_headers)
+
+    response.headers.update(cache_headers)
+
+    # Motor_Image ikut di-join agar tidak ada lazy load, dan history milik user lain tidak bisa diakses
     try:
-        motor = session.get(Motor, id)
+        result = session.exec(select(Motor, Motor_Image).outerjoin(Motor_Image).where(Motor.id == id).where(Motor.user_id == user.id)).first()
     except:
         raise HTTPException(500, detail="Internal Server Error")
     
-    if not motor:
+    if not result:
         raise HTTPException(404)
+
+    motor, motor_image = result
     
-    result = PredictHistory(
+    history = PredictHistory(
         id=motor.id,
         model=motor.model,
         year=motor.year,
@@ -737,7 +1348,7 @@ def get_spesific_history(id: int, payload: Annotated[AccessTokenPayload, Depends
         created_at=motor.created_at
     )
 
-    if not motor.motor_image_id:
-        result.image_url = get_cloud_storage_public_url(motor.motor_image.filename, CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY),
+    if motor_image:
+        history.image_url = get_cloud_storage_public_url(motor_image.filename, CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY)
     
-    return result
+    return history
@@ -0,0 +1,123 @@
+import bisect
+import threading
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+def _format_labels(label_names: tuple, label_values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{str(value)}"' for name, value in zip(label_names, label_values)]
+
+    if extra:
+        parts.append(extra)
+
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        super().__init__(name, documentation, labels)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = super().render()
+
+        with self._lock:
+            values = list(self._values.items())
+
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+
+        return lines
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+
+        with self._lock:
+            state = self._values.get(key)
+
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+
+            # Hanya satu bucket yang ditambah, nilai kumulatif dihitung saat render
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += 1
+            state[2] += value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+
+        with self._lock:
+            values = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+
+        for key, (bucket_counts, count, total) in values:
+            cumulative = 0
+
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.label_names, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+
+            bucket_labels = _format_labels(self.label_names, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+
+        return lines
+
+def render_prometheus() -> str:
+    with _registry_lock:
+        metrics = list(_registry)
+
+    lines = []
+
+    for metric in metrics:
+        lines.extend(metric.render())
+
+    return "\n".join(lines) + "\n"
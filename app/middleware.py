@@ -0,0 +1,39 @@
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+class BodySizeLimitMiddleware:
+    def __init__(self, app: ASGIApp, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+
+        # Request yang jelas terlalu besar ditolak sebelum body-nya dibaca
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body_size:
+            response = JSONResponse({"detail": "Request body too large"}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+
+            message = await receive()
+
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+
+                # Untuk chunked upload tanpa Content-Length, batas dicek sambil streaming
+                if received > self.max_body_size:
+                    raise HTTPException(413, detail="Request body too large")
+
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -31,6 +31,9 @@ class MotorImagePredictor:
     def predict_image(self, img):  # Changed method name from predict to predict_image
         processed_image = self.preprocess_image(img)
 
+        return self.predict_processed(processed_image)
+
+    def predict_processed(self, processed_image):
         # Get raw predictions
         raw_predictions = self.model.predict(processed_image, verbose=1)
 
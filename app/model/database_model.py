@@ -1,5 +1,6 @@
 from datetime import datetime
-from sqlmodel import Field, SQLModel, Relationship
+from sqlalchemy import Enum
+from sqlmodel import Field, SQLModel, Relationship, Index
 from pydantic import EmailStr
 from typing import Literal
 
@@ -16,6 +17,11 @@ class User(SQLModel, table=True):
     forgot_password: list["Forgot_Password"] = Relationship(back_populates="user", cascade_delete=True)
 
 class Forgot_Password(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_forgot_password_user_id_expire", "user_id", "expire"),
+        Index("ix_forgot_password_expire", "expire"),
+    )
+
     uuid: str = Field(primary_key=True, max_length=36)
     user_id: int = Field(foreign_key="user.id", ondelete="CASCADE")
     expire: datetime
@@ -23,6 +29,10 @@ class Forgot_Password(SQLModel, table=True):
     user: User = Relationship(back_populates="forgot_password")
 
 class Motor(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_motor_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
     id: int = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id", ondelete="CASCADE")
     motor_image_id: int | None = Field(default=None, foreign_key="motor_image.id", ondelete="SET NULL")
@@ -30,7 +40,7 @@ class Motor(SQLModel, table=True):
     year: int
     mileage: int
     location: str
-    tax: Literal["hidup", "mati"] = Field(sa_type="tax")
+    tax: Literal["hidup", "mati"] = Field(sa_type=Enum("hidup", "mati", name="tax"))
     predicted_price: int
     min_price: int
     max_price: int
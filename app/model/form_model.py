@@ -1,3 +1,4 @@
+import os
 import re
 
 from typing import Literal
@@ -9,6 +10,9 @@ from pydantic import BaseModel, EmailStr, Field, ValidationInfo, field_validator
 PASSWORD_REGEX = r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d).+$'
 USERNAME_REGEX = r'^[a-zA-Z0-9_]+$'
 
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", "20"))
+HISTORY_PAGE_MAX_SIZE = int(os.environ.get("HISTORY_PAGE_MAX_SIZE", "100"))
+
 class RegisterForm(BaseModel):
     email: EmailStr
     password: str = Field(min_length=8)
@@ -86,7 +90,7 @@ class UpdatePasswordForm(BaseModel):
         return value
 
 class ResetPasswordForm(BaseModel):
-    token: str = Field(max_length=36)
+    token: str = Field(max_length=512)
     password: str = Field(min_length=8)
     confirm_password: str
 
@@ -114,3 +118,19 @@ class PricePredictForm(BaseModel):
     mileage: int
     location: str
     tax: Literal["hidup", "mati"]
+
+class UploadSessionForm(BaseModel):
+    content_type: Literal["image/jpeg", "image/png", "image/webp"]
+    size: int = Field(gt=0)
+
+class FinalizeUploadForm(BaseModel):
+    upload_id: str
+
+class HistoryQuery(BaseModel):
+    limit: int = Field(default=HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_MAX_SIZE)
+    cursor: str | None = None
+    model: Literal['All New Honda Vario 125 & 150', 'All New Honda Vario 125 & 150 Keyless', 'Vario 110', 'Vario 110 ESP', 'Vario 160', 'Vario Techno 110', 'Vario Techno 125 FI'] | None = None
+    year_min: int | None = None
+    year_max: int | None = None
+    price_min: int | None = Field(default=None, ge=0)
+    price_max: int | None = Field(default=None, ge=0)
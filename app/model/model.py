@@ -13,6 +13,26 @@ class AccessTokenPayload(BaseModel):
     id: int
     expr: int
 
+class AuthenticatedUser(BaseModel):
+    id: int
+    email: str
+    username: str
+    name: str
+    photo_profile: str | None
+
+class ResetPasswordPayload(BaseModel):
+    id: int
+    fingerprint: str
+    expr: int
+
+class UploadSessionPayload(BaseModel):
+    id: int
+    purpose: Literal["photo_profile", "motor_image"]
+    filename: str
+    content_type: str
+    size: int
+    expr: int
+
 class PricePredictInput(BaseModel):
     model: Literal['All New Honda Vario 125 & 150', 'All New Honda Vario 125 & 150 Keyless', 'Vario 110', 'Vario 110 ESP', 'Vario 160', 'Vario Techno 110', 'Vario Techno 125 FI']
     year: int
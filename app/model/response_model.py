@@ -32,6 +32,11 @@ class RegisterSuccess(UserDataSuccess):
 class UpdatePhotoSuccess(BaseModel):
     photo_profile: HttpUrl
 
+class UploadSessionSuccess(BaseModel):
+    upload_url: HttpUrl
+    upload_id: str
+    expire: int
+
 class UpdataDataSuccess(BaseModel):
     user: UserDataWithoutPhoto
 
@@ -59,4 +64,5 @@ class PredictHistory(BaseModel):
     created_at: datetime
 
 class AllPredictHistory(BaseModel):
-    histories: list[PredictHistory]
\ No newline at end of file
+    histories: list[PredictHistory]
+    next_cursor: str | None = None
\ No newline at end of file
@@ -0,0 +1,111 @@
+import os
+import time
+import asyncio
+import threading
+import logging
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+
+from auth import hash_password, verify_password
+from metrics import Counter, Gauge, Histogram
+from request_metrics import track_stage
+
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", "16"))
+PASSWORD_HASH_RETRY_AFTER = os.environ.get("PASSWORD_HASH_RETRY_AFTER", "5")
+
+logger = logging.getLogger(__name__)
+
+password_hash_in_flight = Gauge("password_hash_in_flight", "Password hash/verify jobs queued or running")
+password_hash_queue_wait = Histogram("password_hash_queue_wait_seconds", "Time a password job waited for a free hashing worker", ("operation",))
+password_hash_duration = Histogram("password_hash_duration_seconds", "CPU time of a password hash/verify job", ("operation",))
+password_hash_rejected = Counter("password_hash_rejected_total", "Password jobs rejected because the hashing queue was full", ("operation",))
+password_hash_pool_restarts = Counter("password_hash_pool_restarts_total", "Hashing process pools recreated after a worker died")
+
+def _timed_job(function, *args):
+    # Dijalankan di process worker, waktu mulai dikirim balik untuk menghitung lama antre
+    started_at = time.time()
+    result = function(*args)
+
+    return started_at, time.time() - started_at, result
+
+class PasswordHasher:
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # spawn, karena fork setelah TensorFlow dan thread lain berjalan tidak aman
+        executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+        # Worker dibuat sekarang, bukan saat login pertama
+        for _ in range(self.workers):
+            executor.submit(time.time)
+
+        return executor
+
+    def start(self):
+        self._executor = self._create_executor()
+
+    def _replace_broken(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            # Request lain yang gagal bersamaan mungkin sudah mengganti pool-nya
+            if self._executor is not broken:
+                return
+
+            logger.error("Password hashing worker died, recreating the process pool")
+            password_hash_pool_restarts.inc()
+
+            self._executor = self._create_executor()
+
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        if self._executor:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, operation: str, function, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                password_hash_rejected.inc(operation=operation)
+                raise HTTPException(503, detail="Service Unavailable, please try again later", headers={"Retry-After": PASSWORD_HASH_RETRY_AFTER})
+
+            self._pending += 1
+            password_hash_in_flight.set(self._pending)
+            executor = self._executor
+
+        submitted_at = time.time()
+
+        try:
+            with track_stage("auth"):
+                started_at, duration, result = await asyncio.get_running_loop().run_in_executor(executor, _timed_job, function, *args)
+        except BrokenProcessPool:
+            # Worker mati (OOM/signal): pool diganti, hanya request ini yang ditolak
+            self._replace_broken(executor)
+            raise HTTPException(503, detail="Service Unavailable, please try again later", headers={"Retry-After": PASSWORD_HASH_RETRY_AFTER})
+        finally:
+            with self._lock:
+                self._pending -= 1
+                password_hash_in_flight.set(self._pending)
+
+        password_hash_queue_wait.observe(max(0.0, started_at - submitted_at), operation=operation)
+        password_hash_duration.observe(duration, operation=operation)
+
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", hash_password, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run("verify", verify_password, password, hashed_password)
+
+password_hasher = PasswordHasher()
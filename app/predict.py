@@ -1,6 +1,8 @@
 import os
 import io
 
+from typing import BinaryIO
+
 from PIL import Image
 import tensorflow as tf
 
@@ -9,30 +11,39 @@ from utility import CLOUD_BUCKET_RESOURCE, IMAGE_MODEL_NAME, PRICE_MODEL_NAME
 
 from model.model import PricePredictInput
 from ml import MotorImagePredictor, MotorPricePredictorWithRange
+from request_metrics import track_stage, track_inference
+
+IMAGE_MODEL_PATH = os.environ.get("IMAGE_MODEL_PATH", "app/image_model.keras")
+PRICE_MODEL_PATH = os.environ.get("PRICE_MODEL_PATH", "app/price_model.joblib")
 
-if not os.path.isfile("app/image_model.keras"):
+if not os.path.isfile(IMAGE_MODEL_PATH):
     print("Start load image model")
-    download_file_from_google_cloud("app/image_model.keras", IMAGE_MODEL_NAME, "image_recognition/", CLOUD_BUCKET_RESOURCE)
+    download_file_from_google_cloud(IMAGE_MODEL_PATH, IMAGE_MODEL_NAME, "image_recognition/", CLOUD_BUCKET_RESOURCE)
     print("Load image finished")
 
-if not os.path.isfile("app/price_model.joblib"):
+if not os.path.isfile(PRICE_MODEL_PATH):
     print("Start load price model")
-    download_file_from_google_cloud("app/price_model.joblib", PRICE_MODEL_NAME, "price_prediction/", CLOUD_BUCKET_RESOURCE)
+    download_file_from_google_cloud(PRICE_MODEL_PATH, PRICE_MODEL_NAME, "price_prediction/", CLOUD_BUCKET_RESOURCE)
     print("Load price model finished")
 
-image_model = MotorImagePredictor(model_path="app/image_model.keras")
+image_model = MotorImagePredictor(model_path=IMAGE_MODEL_PATH)
 
-price_model = MotorPricePredictorWithRange(model_path="app/price_model.joblib")
+price_model = MotorPricePredictorWithRange(model_path=PRICE_MODEL_PATH)
 
-def predict_uploaded_image(file: bytes):
+def predict_uploaded_image(file: bytes | BinaryIO):
     try:
-        img = Image.open(io.BytesIO(file))
+        with track_stage("decode"):
+            img = Image.open(io.BytesIO(file) if isinstance(file, bytes) else file)
+            img.load()
+
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
 
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
+        with track_stage("preprocess"):
+            processed_image = image_model.preprocess_image(img)
 
-        # Get and display predictions using the correct method name
-        predictions = image_model.predict_image(img)  # Changed from predict to predict_image
+        with track_inference("image_model", batch_size=processed_image.shape[0]):
+            predictions = image_model.predict_processed(processed_image)
 
         return {
             "status": "success",
@@ -45,6 +56,7 @@ def predict_uploaded_image(file: bytes):
         }
 
 def predict_motor_price(data: PricePredictInput):
-    result = price_model.predict(data.model_dump())
+    with track_inference("price_model"):
+        result = price_model.predict(data.model_dump())
 
     return result
@@ -0,0 +1,107 @@
+import os
+import math
+import time
+import threading
+
+from collections import OrderedDict
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Cookie, Header, Response
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from auth import validate_jwt
+from database import async_engine, create_read_session, is_recent_write, DB_REPLICA_MAX_LAG_SECONDS
+from model.model import AccessTokenPayload, AuthenticatedUser
+from model.database_model import User
+from request_metrics import track_stage
+
+USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_SIZE = int(os.environ.get("USER_CACHE_MAX_SIZE", "10000"))
+
+PRIMARY_PIN_COOKIE = "last_write"
+PRIMARY_PIN_HEADER = "X-Last-Write"
+
+class UserCache:
+    def __init__(self, ttl: float = USER_CACHE_TTL_SECONDS, max_size: int = USER_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> AuthenticatedUser | None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+
+            if entry is None:
+                return None
+
+            expires_at, user = entry
+
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+
+            self._entries.move_to_end(user_id)
+
+            return user
+
+    def put(self, user: User) -> AuthenticatedUser:
+        authenticated_user = AuthenticatedUser(id=user.id, email=user.email, username=user.username, name=user.name, photo_profile=user.photo_profile)
+
+        if self.ttl <= 0:
+            return authenticated_user
+
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, authenticated_user)
+            self._entries.move_to_end(user.id)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return authenticated_user
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+user_cache = UserCache()
+
+async def get_current_user(payload: Annotated[AccessTokenPayload, Depends(validate_jwt)]) -> AuthenticatedUser:
+    with track_stage("auth"):
+        authenticated_user = user_cache.get(payload.id)
+
+        if authenticated_user:
+            return authenticated_user
+
+        try:
+            async with AsyncSession(async_engine) as session:
+                user = await session.get(User, payload.id)
+        except:
+            raise HTTPException(500, detail="Internal Server Error")
+
+    if not user:
+        raise HTTPException(401, detail="User Unknown")
+
+    return user_cache.put(user)
+
+CurrentUser = Annotated[AuthenticatedUser, Depends(get_current_user)]
+
+def pin_primary(response: Response):
+    # Disimpan di client (cookie untuk browser, header untuk client lain), bukan di memori worker yang menerima write
+    last_write = f"{time.time():.3f}"
+
+    response.set_cookie(PRIMARY_PIN_COOKIE, last_write, max_age=math.ceil(DB_REPLICA_MAX_LAG_SECONDS), httponly=True, samesite="lax")
+    response.headers[PRIMARY_PIN_HEADER] = last_write
+
+def get_primary_pin(last_write: Annotated[str | None, Cookie(alias=PRIMARY_PIN_COOKIE)] = None, x_last_write: Annotated[str | None, Header(alias=PRIMARY_PIN_HEADER)] = None) -> bool:
+    return is_recent_write(x_last_write or last_write)
+
+PrimaryPinned = Annotated[bool, Depends(get_primary_pin)]
+
+def get_user_read_session(use_primary: PrimaryPinned):
+    with create_read_session(use_primary) as session:
+        yield session
+
+UserReadSessionDatabase = Annotated[Session, Depends(get_user_read_session)]
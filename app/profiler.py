@@ -0,0 +1,275 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import secrets
+import functools
+import logging
+import threading
+
+from collections import Counter as FrameCounter
+from contextvars import ContextVar
+from datetime import datetime, timezone, timedelta
+
+import jwt
+
+from starlette.types import ASGIApp, Receive, Scope, Send, Message
+
+from metrics import Counter
+
+PROFILER_SECRET = os.environ.get("PROFILER_SECRET", "") # Kosong: header X-Profile-Token tidak diterima
+PROFILER_SAMPLE_RATE = float(os.environ.get("PROFILER_SAMPLE_RATE", "0"))
+PROFILER_DIRECTORY = os.environ.get("PROFILER_DIRECTORY", "app/profiles")
+PROFILER_MAX_FILES = int(os.environ.get("PROFILER_MAX_FILES", "200"))
+PROFILER_MAX_CONCURRENT = int(os.environ.get("PROFILER_MAX_CONCURRENT", "1"))
+PROFILER_INTERVAL_MS = float(os.environ.get("PROFILER_INTERVAL_MS", "5"))
+PROFILER_MAX_SECONDS = float(os.environ.get("PROFILER_MAX_SECONDS", "30"))
+
+PROFILER_AUDIENCE = "profiler"
+PROFILER_ALGORITHM = "HS256"
+
+logger = logging.getLogger(__name__)
+
+profiled_requests = Counter("profiled_requests_total", "Requests profiled by the sampling profiler", ("trigger",))
+profiler_skipped = Counter("profiler_skipped_total", "Profile requests skipped because the concurrency cap was reached")
+
+_profiled_request: ContextVar["RequestProfile | None"] = ContextVar("profiled_request", default=None)
+
+def encode_profile_token(minutes: int = 60) -> str:
+    expire_time = datetime.now(timezone.utc) + timedelta(minutes=minutes)
+
+    return jwt.encode({"aud": PROFILER_AUDIENCE, "exp": expire_time}, PROFILER_SECRET, PROFILER_ALGORITHM)
+
+def is_valid_profile_token(token: str) -> bool:
+    if not PROFILER_SECRET:
+        return False
+
+    try:
+        jwt.decode(token, PROFILER_SECRET, PROFILER_ALGORITHM, audience=PROFILER_AUDIENCE)
+    except:
+        return False
+
+    return True
+
+def _thread_cpu_clock(thread_id: int):
+    # Hanya tersedia di Linux/Unix, tanpa ini profile CPU tidak dibuat
+    try:
+        return time.pthread_getcpuclockid(thread_id)
+    except (AttributeError, OSError):
+        return None
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _wrap_endpoint(call):
+    # Frame profiled_call menandai request mana yang sedang dijalankan endpoint, dibaca sampler lewat f_locals
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def profiled_call(*args, **kwargs):
+            profile = _profiled_request.get()
+            return await call(*args, **kwargs)
+    else:
+        @functools.wraps(call)
+        def profiled_call(*args, **kwargs):
+            profile = _profiled_request.get()
+            return call(*args, **kwargs)
+
+    profiled_call.profiler_wrapped = True
+
+    return profiled_call
+
+def instrument_routes(app):
+    # dependant.call dipanggil ulang tiap request, jadi cukup diganti sekali; sifat sync/async tetap sama
+    for route in getattr(app, "routes", []):
+        dependant = getattr(route, "dependant", None)
+
+        if dependant is not None and dependant.call is not None and not getattr(dependant.call, "profiler_wrapped", False):
+            dependant.call = _wrap_endpoint(dependant.call)
+
+def _is_profiled_by(frame, profile) -> bool:
+    caller = frame.f_back
+
+    return caller is not None and caller.f_code.co_name == "profiled_call" and caller.f_code.co_filename == __file__ and caller.f_locals.get("profile") is profile
+
+def _endpoint_stack(frame, endpoint_code, profile) -> list[str] | None:
+    # Stack dipotong mulai dari frame endpoint, frame event loop / threadpool di atasnya dibuang.
+    # Endpoint yang sama milik request lain (tanpa penanda profile ini) tidak ikut dihitung
+    labels = []
+
+    while frame is not None:
+        labels.append(_frame_label(frame))
+
+        if frame.f_code is endpoint_code:
+            return labels[::-1] if _is_profiled_by(frame, profile) else None
+
+        frame = frame.f_back
+
+    return None
+
+class RequestProfile:
+    def __init__(self, scope: Scope, interval: float = PROFILER_INTERVAL_MS / 1000, max_seconds: float = PROFILER_MAX_SECONDS):
+        self.scope = scope
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.profile_id = f"{int(time.time())}-{secrets.token_hex(4)}"
+
+        self.wall = FrameCounter()
+        self.cpu = FrameCounter()
+
+        self._cpu_times = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample_loop, name=f"profiler-{self.profile_id}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample_loop(self):
+        deadline = time.monotonic() + self.max_seconds
+        own_thread = threading.get_ident()
+
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            endpoint = self.scope.get("endpoint")
+
+            if endpoint is None:
+                self.wall[("[routing]",)] += 1
+                continue
+
+            running = False
+
+            # Route sync berjalan di thread threadpool, route async di thread event loop
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+
+                stack = _endpoint_stack(frame, getattr(endpoint, "__code__", None), self)
+
+                if stack is None:
+                    continue
+
+                running = True
+                stack = tuple(stack)
+                self.wall[stack] += 1
+
+                if self._used_cpu(thread_id):
+                    self.cpu[stack] += 1
+
+            if not running:
+                # Coroutine sedang menunggu (await I/O) atau masih di dependency
+                self.wall[(endpoint.__name__, "[awaiting]")] += 1
+
+    def _used_cpu(self, thread_id: int) -> bool:
+        clock = _thread_cpu_clock(thread_id)
+
+        if clock is None:
+            return False
+
+        try:
+            cpu_time = time.clock_gettime(clock)
+        except OSError:
+            return False
+
+        previous = self._cpu_times.get(thread_id, cpu_time)
+        self._cpu_times[thread_id] = cpu_time
+
+        # Thread dianggap memakai CPU jika clock-nya maju minimal separuh interval sampling
+        return cpu_time - previous >= self.interval / 2
+
+    def write(self, directory: str = PROFILER_DIRECTORY):
+        os.makedirs(directory, exist_ok=True)
+
+        route = self.scope.get("route")
+        route_name = (route.path if route is not None else self.scope["path"]).strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        prefix = os.path.join(directory, f"{self.profile_id}-{self.scope['method']}-{route_name}")
+
+        # Format collapsed stack, bisa langsung dibuka dengan flamegraph.pl atau speedscope
+        for kind, samples in (("wall", self.wall), ("cpu", self.cpu)):
+            if not samples:
+                continue
+
+            with open(f"{prefix}.{kind}.folded", "w") as destination:
+                for stack, count in samples.items():
+                    destination.write(f"{';'.join(stack)} {count}\n")
+
+        _remove_old_profiles(directory)
+
+def _remove_old_profiles(directory: str, max_files: int = PROFILER_MAX_FILES):
+    files = sorted((entry for entry in os.scandir(directory) if entry.name.endswith(".folded")), key=lambda entry: entry.stat().st_mtime)
+
+    for entry in files[:max(0, len(files) - max_files)]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+class ProfilerMiddleware:
+    def __init__(self, app: ASGIApp, sample_rate: float = PROFILER_SAMPLE_RATE, max_concurrent: int = PROFILER_MAX_CONCURRENT):
+        self.app = app
+        self.sample_rate = sample_rate
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._instrumented = False
+
+    def _trigger(self, scope: Scope) -> str | None:
+        token = dict(scope["headers"]).get(b"x-profile-token")
+
+        if token and is_valid_profile_token(token.decode("latin-1")):
+            return "header"
+
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        trigger = self._trigger(scope) if scope["type"] == "http" else None
+
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Batas overhead: request lain tidak diprofile selama slot penuh
+        if not self._slots.acquire(blocking=False):
+            profiler_skipped.inc()
+            await self.app(scope, receive, send)
+            return
+
+        if not self._instrumented:
+            instrument_routes(scope.get("app"))
+            self._instrumented = True
+
+        profile = RequestProfile(scope)
+
+        async def send_with_profile_id(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.profile_id.encode())]
+
+            await send(message)
+
+        profile.start()
+        token = _profiled_request.set(profile)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _profiled_request.reset(token)
+            await asyncio.to_thread(self._finish, profile)
+            profiled_requests.inc(trigger=trigger)
+
+    def _finish(self, profile: RequestProfile):
+        try:
+            profile.stop()
+            profile.write()
+        except OSError:
+            logger.exception("Failed to write profile %s", profile.profile_id)
+        finally:
+            self._slots.release()
+
+if __name__ == "__main__":
+    # Membuat token untuk header X-Profile-Token
+    print(encode_profile_token())
@@ -0,0 +1,113 @@
+import os
+import time
+import logging
+
+from contextvars import ContextVar
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Receive, Scope, Send, Message
+
+from metrics import Counter, Histogram
+from request_metrics import observe_stage
+
+# off: hanya dihitung, warn: log jika melebihi budget, strict: request gagal (untuk test)
+DB_QUERY_BUDGET_MODE = os.environ.get("DB_QUERY_BUDGET_MODE", "warn")
+DB_QUERY_DEFAULT_BUDGET = int(os.environ.get("DB_QUERY_DEFAULT_BUDGET", "10"))
+
+logger = logging.getLogger(__name__)
+
+db_queries_per_request = Histogram("db_queries_per_request", "SQL statements executed per request", ("route",), buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50))
+db_query_budget_exceeded = Counter("db_query_budget_exceeded_total", "Requests that executed more SQL statements than their budget", ("route",))
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+_current_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+
+    if stats is not None:
+        stats.count += 1
+        stats.duration += time.perf_counter() - context._query_started
+
+def instrument_engine(engine: Engine):
+    if not event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def query_budget(limit: int) -> Callable:
+    # Dipasang di bawah decorator route, contoh: @query_budget(2)
+    def decorator(endpoint: Callable) -> Callable:
+        endpoint.query_budget = limit
+        return endpoint
+
+    return decorator
+
+class QueryStatsMiddleware:
+    def __init__(self, app: ASGIApp, mode: str = DB_QUERY_BUDGET_MODE, default_budget: int = DB_QUERY_DEFAULT_BUDGET):
+        self.app = app
+        self.mode = mode
+        self.default_budget = default_budget
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+
+        async def send_with_stats(message: Message):
+            if message["type"] == "http.response.start":
+                self._check_budget(scope, stats)
+
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-query-count", str(stats.count).encode()),
+                    (b"x-db-time-ms", f"{stats.duration * 1000:.1f}".encode())
+                ]
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current_stats.reset(token)
+
+            route = scope.get("route")
+
+            if route is not None:
+                db_queries_per_request.observe(stats.count, route=route.path)
+                observe_stage("db", stats.duration)
+
+    def _check_budget(self, scope: Scope, stats: QueryStats):
+        if self.mode == "off":
+            return
+
+        endpoint = scope.get("endpoint")
+        budget = getattr(endpoint, "query_budget", self.default_budget)
+
+        if stats.count <= budget:
+            return
+
+        route = scope.get("route")
+        route_path = route.path if route is not None else scope["path"]
+
+        db_query_budget_exceeded.inc(route=route_path)
+
+        message = f"{scope['method']} {route_path} executed {stats.count} SQL statements, budget is {budget}"
+
+        if self.mode == "strict":
+            raise QueryBudgetExceeded(message)
+
+        logger.warning(message)
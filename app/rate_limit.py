@@ -0,0 +1,181 @@
+import os
+import math
+import ipaddress
+import time
+import logging
+import threading
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+
+from metrics import Counter
+
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL", "redis://127.0.0.1:6379/0")
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Daftar IP/CIDR load balancer dipisah koma, contoh 169.254.0.0/16 untuk Cloud Run
+RATE_LIMIT_TRUSTED_PROXIES = [ipaddress.ip_network(network.strip()) for network in os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", "").split(",") if network.strip()]
+
+RATE_LIMIT_IP_PER_MINUTE = float(os.environ.get("RATE_LIMIT_IP_PER_MINUTE", "20"))
+RATE_LIMIT_IP_BURST = int(os.environ.get("RATE_LIMIT_IP_BURST", "10"))
+RATE_LIMIT_ACCOUNT_PER_MINUTE = float(os.environ.get("RATE_LIMIT_ACCOUNT_PER_MINUTE", "5"))
+RATE_LIMIT_ACCOUNT_BURST = int(os.environ.get("RATE_LIMIT_ACCOUNT_BURST", "5"))
+
+logger = logging.getLogger(__name__)
+
+rate_limited_requests = Counter("rate_limited_requests_total", "Requests rejected by the token-bucket throttle", ("name", "key"))
+
+class RateLimitBackend(ABC):
+    @abstractmethod
+    async def take(self, key: str, rate: float, capacity: int) -> float:
+        # Mengembalikan 0 jika token tersedia, selain itu berapa detik sampai token berikutnya
+        pass
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, rate: float, capacity: int) -> float:
+        now = time.monotonic()
+
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+
+            retry_after = 0.0
+
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / rate
+
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        return retry_after
+
+# Dijalankan atomik di Redis, waktu diambil dari server Redis agar sama untuk semua worker
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+
+local retry_after = 0
+
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+
+return tostring(retry_after)
+"""
+
+class RedisRateLimitBackend(RateLimitBackend):
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL):
+        import redis.asyncio
+
+        self.client = redis.asyncio.Redis.from_url(url)
+        self.script = self.client.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, key: str, rate: float, capacity: int) -> float:
+        try:
+            return float(await self.script(keys=[f"rate-limit:{key}"], args=[rate, capacity]))
+        except Exception as e:
+            # Redis tidak tersedia tidak boleh membuat login ikut mati
+            logger.warning("Rate limit backend unavailable, request allowed: %s", e)
+            return 0.0
+
+_rate_limit_backend = None
+_rate_limit_backend_lock = threading.Lock()
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    global _rate_limit_backend
+
+    if _rate_limit_backend is None:
+        with _rate_limit_backend_lock:
+            if _rate_limit_backend is None:
+                if RATE_LIMIT_BACKEND == "memory":
+                    _rate_limit_backend = MemoryRateLimitBackend()
+                elif RATE_LIMIT_BACKEND == "redis":
+                    _rate_limit_backend = RedisRateLimitBackend()
+                else:
+                    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {RATE_LIMIT_BACKEND}")
+
+    return _rate_limit_backend
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+
+    return any(ip in network for network in RATE_LIMIT_TRUSTED_PROXIES)
+
+def resolve_client_ip(request: Request) -> str:
+    peer = request.client.host if request.client else "unknown"
+
+    if not _is_trusted_proxy(peer):
+        return peer
+
+    # X-Forwarded-For dibaca dari kanan, alamat pertama yang bukan proxy terpercaya adalah client;
+    # alamat di sebelah kirinya bisa dipalsukan oleh client
+    forwarded = [address.strip() for header in request.headers.getlist("x-forwarded-for") for address in header.split(",") if address.strip()]
+
+    for address in reversed(forwarded):
+        if not _is_trusted_proxy(address):
+            return address
+
+    return forwarded[0] if forwarded else peer
+
+class Throttle:
+    def __init__(self, name: str, account_field: str):
+        self.name = name
+        self.account_field = account_field
+
+    async def __call__(self, request: Request):
+        # Dipakai sebagai dependency route, jadi dijalankan sebelum query database dan bcrypt
+        backend = get_rate_limit_backend()
+        client_ip = resolve_client_ip(request)
+
+        retry_after = await backend.take(f"{self.name}:ip:{client_ip}", RATE_LIMIT_IP_PER_MINUTE / 60, RATE_LIMIT_IP_BURST)
+
+        if retry_after:
+            self._reject("ip", retry_after)
+
+        # Body form sudah di-parse oleh FastAPI, request.form() hanya mengambil hasil cache-nya
+        account = (await request.form()).get(self.account_field)
+
+        if isinstance(account, str) and account:
+            retry_after = await backend.take(f"{self.name}:{self.account_field}:{account.strip().lower()}", RATE_LIMIT_ACCOUNT_PER_MINUTE / 60, RATE_LIMIT_ACCOUNT_BURST)
+
+            if retry_after:
+                self._reject(self.account_field, retry_after)
+
+    def _reject(self, key: str, retry_after: float):
+        rate_limited_requests.inc(name=self.name, key=key)
+
+        raise HTTPException(429, detail="Too Many Requests", headers={"Retry-After": str(math.ceil(retry_after))})
+
+login_throttle = Throttle("login", "email")
+forgot_password_throttle = Throttle("forgot-password", "email")
+reset_password_throttle = Throttle("reset-password", "token")
@@ -0,0 +1,83 @@
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from starlette.types import ASGIApp, Receive, Scope, Send, Message
+
+from metrics import Gauge, Histogram
+
+http_request_duration = Histogram("http_request_duration_seconds", "Duration of HTTP requests", ("method", "route", "status"))
+http_requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being handled")
+stage_duration = Histogram("request_stage_duration_seconds", "Time spent in each stage of a request", ("route", "stage"))
+model_batch_size = Histogram("model_batch_size", "Number of inputs per model prediction call", ("model",), buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+model_in_flight = Gauge("model_inference_in_flight", "Model prediction calls currently running", ("model",))
+
+_current_scope: ContextVar[Scope | None] = ContextVar("request_scope", default=None)
+
+def current_route() -> str:
+    # Di luar request (thread upload, email, dll.) stage dicatat sebagai "background"
+    scope = _current_scope.get()
+
+    if scope is None:
+        return "background"
+
+    route = scope.get("route")
+
+    return route.path if route is not None else "unmatched"
+
+def observe_stage(stage: str, duration: float):
+    stage_duration.observe(duration, route=current_route(), stage=stage)
+
+@contextmanager
+def track_stage(stage: str):
+    # Bisa dipakai sebagai context manager maupun decorator
+    started = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+@contextmanager
+def track_inference(model: str, batch_size: int = 1):
+    model_batch_size.observe(batch_size, model=model)
+    model_in_flight.inc(model=model)
+
+    try:
+        with track_stage("inference"):
+            yield
+    finally:
+        model_in_flight.dec(model=model)
+
+class RequestMetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+            await send(message)
+
+        token = _current_scope.set(scope)
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            _current_scope.reset(token)
+
+            route = scope.get("route")
+            http_request_duration.observe(time.perf_counter() - started, method=scope["method"], route=route.path if route is not None else "unmatched", status=status_code)
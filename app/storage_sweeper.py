@@ -0,0 +1,172 @@
+import os
+import logging
+import threading
+
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from background import PeriodicTask
+from cloud_storage import get_storage_gateway
+from auth import UPLOAD_SESSION_EXPR_MINUTES
+from database import engine
+from metrics import Counter, Gauge
+from model.database_model import User, Motor_Image
+from utility import CLOUD_BUCKET, CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY, CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY, UPLOAD_PENDING_PREFIX
+
+STORAGE_DELETE_BATCH_SIZE = int(os.environ.get("STORAGE_DELETE_BATCH_SIZE", "100"))
+STORAGE_DELETE_FLUSH_SECONDS = float(os.environ.get("STORAGE_DELETE_FLUSH_SECONDS", "5"))
+STORAGE_RECONCILE_INTERVAL_MINUTES = float(os.environ.get("STORAGE_RECONCILE_INTERVAL_MINUTES", "360"))
+STORAGE_ORPHAN_MIN_AGE_MINUTES = float(os.environ.get("STORAGE_ORPHAN_MIN_AGE_MINUTES", "60"))
+STORAGE_RECONCILE_CHUNK_SIZE = int(os.environ.get("STORAGE_RECONCILE_CHUNK_SIZE", "1000"))
+# Prefix kosong berarti root bucket; tanpa opt-in ini semua object lain di root bucket bisa ikut terhapus
+STORAGE_RECONCILE_BUCKET_ROOT = os.environ.get("STORAGE_RECONCILE_BUCKET_ROOT", "false").lower() == "true"
+
+STORAGE_RECONCILE_LOCK_NAME = "storage-orphan-reconciler"
+
+logger = logging.getLogger(__name__)
+
+deletion_queue_depth = Gauge("storage_deletion_queue_depth", "Object keys waiting to be deleted from object storage")
+deleted_objects = Counter("storage_deleted_objects_total", "Objects deleted from object storage", ("source",))
+orphan_objects = Counter("storage_orphan_objects_total", "Orphan objects found by the reconciliation job")
+expired_uploads = Counter("storage_expired_uploads_total", "Unfinalized uploads removed from the pending prefix")
+
+class DeletionQueue:
+    def __init__(self, bucket: str = CLOUD_BUCKET, batch_size: int = STORAGE_DELETE_BATCH_SIZE):
+        self.bucket = bucket
+        self.batch_size = batch_size
+
+        self._keys = []
+        self._lock = threading.Lock()
+        self._task = PeriodicTask("storage-deletion-sweeper", STORAGE_DELETE_FLUSH_SECONDS, self.flush, run_on_stop=True)
+
+    def start(self):
+        self._task.start()
+
+    def stop(self):
+        self._task.stop()
+
+    def enqueue(self, keys: list[str]):
+        with self._lock:
+            self._keys.extend(keys)
+            depth = len(self._keys)
+
+        deletion_queue_depth.set(depth)
+
+        if depth >= self.batch_size:
+            self._task.wake()
+
+    def flush(self):
+        while True:
+            with self._lock:
+                batch = self._keys[:self.batch_size]
+                del self._keys[:self.batch_size]
+                depth = len(self._keys)
+
+            deletion_queue_depth.set(depth)
+
+            if not batch:
+                return
+
+            try:
+                get_storage_gateway().delete_many(batch, self.bucket)
+                deleted_objects.inc(len(batch), source="queue")
+            except Exception:
+                # Object yang gagal dihapus akan ditemukan lagi oleh reconciliation job
+                logger.exception("Failed to delete %d objects from storage", len(batch))
+                return
+
+deletion_queue = DeletionQueue()
+
+def queue_file_deletion(filenames: list[str], path: str):
+    deletion_queue.enqueue([f"{path}{filename}" for filename in filenames if filename])
+
+def _known_filenames(session: Session, prefix: str, filenames: list[str]) -> set[str]:
+    known = set()
+
+    if prefix == CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY:
+        known.update(session.exec(select(User.photo_profile).where(User.photo_profile.in_(filenames))).all())
+
+    if prefix == CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY:
+        known.update(session.exec(select(Motor_Image.filename).where(Motor_Image.filename.in_(filenames))).all())
+
+    return known
+
+def _queue_orphans(prefix: str, candidates: list[str]):
+    # Satu transaksi pendek per chunk, jadi row yang baru di-commit tetap terlihat di chunk berikutnya
+    with Session(engine) as session:
+        known = _known_filenames(session, prefix, candidates)
+
+    orphans = [filename for filename in candidates if filename not in known]
+
+    if orphans:
+        logger.info("Removing %d orphan objects under '%s'", len(orphans), prefix)
+        orphan_objects.inc(len(orphans))
+        queue_file_deletion(orphans, prefix)
+
+def sweep_pending_uploads():
+    if not UPLOAD_PENDING_PREFIX:
+        logger.warning("UPLOAD_PENDING_PREFIX is empty, unfinalized uploads are not swept")
+        return
+
+    # Upload session yang belum kadaluarsa masih boleh di-finalize, jadi object-nya tidak disentuh
+    min_updated = datetime.now(timezone.utc) - timedelta(minutes=max(STORAGE_ORPHAN_MIN_AGE_MINUTES, UPLOAD_SESSION_EXPR_MINUTES))
+    expired = []
+
+    for key, updated in get_storage_gateway().list_objects(UPLOAD_PENDING_PREFIX, CLOUD_BUCKET):
+        if updated <= min_updated:
+            expired.append(key)
+
+        if len(expired) >= STORAGE_RECONCILE_CHUNK_SIZE:
+            expired_uploads.inc(len(expired))
+            deletion_queue.enqueue(expired)
+            expired = []
+
+    if expired:
+        expired_uploads.inc(len(expired))
+        deletion_queue.enqueue(expired)
+
+def _reconcile_prefix(prefix: str, min_updated: datetime):
+    candidates = []
+
+    for key, updated in get_storage_gateway().list_objects(prefix, CLOUD_BUCKET):
+        filename = key[len(prefix):]
+
+        # Object yang masih baru dilewati, bisa jadi row database-nya belum di-commit
+        if "/" in filename or updated > min_updated:
+            continue
+
+        candidates.append(filename)
+
+        # Dicek per chunk dengan WHERE ... IN, jadi semua filename di database tidak perlu dimuat sekaligus
+        if len(candidates) >= STORAGE_RECONCILE_CHUNK_SIZE:
+            _queue_orphans(prefix, candidates)
+            candidates = []
+
+    if candidates:
+        _queue_orphans(prefix, candidates)
+
+def reconcile_orphan_objects():
+    min_updated = datetime.now(timezone.utc) - timedelta(minutes=STORAGE_ORPHAN_MIN_AGE_MINUTES)
+
+    # Advisory lock MySQL dipegang selama job berjalan, worker lain yang jadwalnya bersamaan melewati putaran ini
+    with engine.connect() as connection:
+        if not connection.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": STORAGE_RECONCILE_LOCK_NAME}).scalar():
+            logger.info("Orphan reconciliation is already running in another process, skipped")
+            return
+
+        try:
+            # Prefix pending selalu disapu, tidak bergantung pada STORAGE_RECONCILE_BUCKET_ROOT
+            sweep_pending_uploads()
+
+            for prefix in {CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY, CLOUD_BUCKET_MOTOR_IMAGE_DIRECTORY}:
+                if not prefix and not STORAGE_RECONCILE_BUCKET_ROOT:
+                    logger.warning("Skipping orphan reconciliation of the bucket root, set STORAGE_RECONCILE_BUCKET_ROOT=true if the bucket only holds files of this app")
+                    continue
+
+                _reconcile_prefix(prefix, min_updated)
+        finally:
+            connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": STORAGE_RECONCILE_LOCK_NAME})
+
+orphan_reconciler = PeriodicTask("storage-orphan-reconciler", STORAGE_RECONCILE_INTERVAL_MINUTES * 60, reconcile_orphan_objects)
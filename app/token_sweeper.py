@@ -0,0 +1,44 @@
+import os
+import logging
+
+from datetime import datetime, timezone, timedelta
+
+from sqlmodel import Session, select, delete, col
+
+from background import PeriodicTask
+from database import engine
+from metrics import Counter
+from model.database_model import Forgot_Password
+
+FORGOT_PASSWORD_PURGE_INTERVAL_MINUTES = float(os.environ.get("FORGOT_PASSWORD_PURGE_INTERVAL_MINUTES", "15"))
+FORGOT_PASSWORD_PURGE_BATCH_SIZE = int(os.environ.get("FORGOT_PASSWORD_PURGE_BATCH_SIZE", "1000"))
+FORGOT_PASSWORD_RETENTION_MINUTES = float(os.environ.get("FORGOT_PASSWORD_RETENTION_MINUTES", "60"))
+
+logger = logging.getLogger(__name__)
+
+purged_tokens = Counter("forgot_password_purged_tokens_total", "Expired forgot-password tokens removed by the purge job")
+
+def purge_expired_tokens():
+    # Token yang baru kedaluwarsa masih dipakai untuk jeda 10 menit antar permintaan reset
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=FORGOT_PASSWORD_RETENTION_MINUTES)
+    total = 0
+
+    while True:
+        # Dihapus per batch agar lock dan transaksi tetap kecil
+        with Session(engine) as session:
+            uuids = session.exec(select(Forgot_Password.uuid).where(Forgot_Password.expire < cutoff).limit(FORGOT_PASSWORD_PURGE_BATCH_SIZE)).all()
+
+            if uuids:
+                session.exec(delete(Forgot_Password).where(col(Forgot_Password.uuid).in_(uuids)))
+                session.commit()
+
+        total += len(uuids)
+        purged_tokens.inc(len(uuids))
+
+        if len(uuids) < FORGOT_PASSWORD_PURGE_BATCH_SIZE:
+            break
+
+    if total:
+        logger.info("Purged %d expired forgot-password tokens", total)
+
+forgot_password_purger = PeriodicTask("forgot-password-purger", FORGOT_PASSWORD_PURGE_INTERVAL_MINUTES * 60, purge_expired_tokens)
@@ -0,0 +1,265 @@
+import os
+import json
+import fcntl
+import time
+import heapq
+import random
+import shutil
+import logging
+import secrets
+import threading
+
+from typing import BinaryIO
+
+from cloud_storage import get_storage_gateway
+from metrics import Counter, Gauge, Histogram
+
+UPLOAD_SPOOL_DIRECTORY = os.environ.get("UPLOAD_SPOOL_DIRECTORY", "app/spool/uploads")
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "4"))
+UPLOAD_MAX_ATTEMPTS = int(os.environ.get("UPLOAD_MAX_ATTEMPTS", "8"))
+UPLOAD_RETRY_BASE_DELAY = float(os.environ.get("UPLOAD_RETRY_BASE_DELAY", "1"))
+UPLOAD_RETRY_MAX_DELAY = float(os.environ.get("UPLOAD_RETRY_MAX_DELAY", "300"))
+
+logger = logging.getLogger(__name__)
+
+upload_queue_depth = Gauge("upload_queue_depth", "Spooled uploads waiting to be sent to object storage")
+upload_latency = Histogram("upload_latency_seconds", "Duration of a single object storage upload attempt", ("outcome",))
+upload_spool_age = Histogram("upload_spool_age_seconds", "Time between spooling a file and finishing its upload", buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600))
+upload_retries = Counter("upload_retries_total", "Upload attempts that failed and were rescheduled")
+upload_failures = Counter("upload_failures_total", "Uploads abandoned after the maximum number of attempts")
+
+def _already_uploaded(error: Exception) -> bool:
+    # Percobaan sebelumnya ternyata sudah berhasil (precondition if_generation_match=0 gagal)
+    return isinstance(error, FileExistsError) or getattr(error, "code", None) == 412
+
+class UploadQueue:
+    def __init__(self, directory: str = UPLOAD_SPOOL_DIRECTORY, workers: int = UPLOAD_WORKERS, max_attempts: int = UPLOAD_MAX_ATTEMPTS):
+        self.directory = directory
+        self.failed_directory = os.path.join(directory, "failed")
+        self.workers = workers
+        self.max_attempts = max_attempts
+
+        # Subfolder milik process ini, dikunci dengan flock selama process hidup
+        self.job_directory = None
+        self._lock_file = None
+
+        self._heap = []
+        self._condition = threading.Condition()
+        self._threads = []
+        self._running = False
+
+    def _claim_job_directory(self):
+        # Lock diambil sebelum namanya terlihat, jadi process lain tidak pernah mengira folder ini yatim
+        name = f"worker-{os.getpid()}-{secrets.token_hex(4)}"
+        pending_lock_path = os.path.join(self.directory, f".{name}.lock")
+
+        self._lock_file = open(pending_lock_path, "w")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        self.job_directory = os.path.join(self.directory, name)
+        os.makedirs(self.job_directory)
+        os.replace(pending_lock_path, self.job_directory + ".lock")
+
+    def _move_jobs(self, source_directory: str):
+        # Metadata dipindah duluan dengan os.rename yang atomic: hanya satu process yang berhasil mengklaim job
+        for entry in sorted(os.listdir(source_directory)):
+            if not entry.endswith(".json"):
+                continue
+
+            job_id = entry[:-len(".json")]
+
+            try:
+                os.rename(os.path.join(source_directory, entry), self._meta_path(job_id))
+            except FileNotFoundError:
+                continue
+
+            try:
+                os.rename(os.path.join(source_directory, f"{job_id}.data"), self._data_path(job_id))
+            except FileNotFoundError:
+                logger.error("Spooled upload %s has no data file, dropping it", job_id)
+                os.remove(self._meta_path(job_id))
+
+    def _adopt_orphaned_jobs(self):
+        # Job milik process yang sudah mati (lock-nya bisa diambil) dipindah ke folder process ini
+        for entry in sorted(os.listdir(self.directory)):
+            lock_path = os.path.join(self.directory, entry)
+            orphan_directory = lock_path[:-len(".lock")]
+
+            if not entry.startswith("worker-") or not entry.endswith(".lock") or orphan_directory == self.job_directory:
+                continue
+
+            with open(lock_path, "a") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+
+                try:
+                    self._move_jobs(orphan_directory)
+                    shutil.rmtree(orphan_directory, ignore_errors=True)
+                except FileNotFoundError:
+                    pass
+
+                os.remove(lock_path)
+
+        # Spool lama sebelum ada subfolder per process
+        self._move_jobs(self.directory)
+
+    def start(self):
+        os.makedirs(self.failed_directory, exist_ok=True)
+
+        self._claim_job_directory()
+        self._adopt_orphaned_jobs()
+
+        with self._condition:
+            self._running = True
+
+        # Job yang masih tersisa di spool (misalnya karena server restart) dijadwalkan ulang
+        for entry in sorted(os.listdir(self.job_directory)):
+            if entry.endswith(".json"):
+                self._schedule(entry[:-len(".json")], time.monotonic())
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"upload-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+        for thread in self._threads:
+            thread.join(timeout)
+
+        self._threads = []
+
+        if self._lock_file is not None:
+            # Folder kosong dibersihkan, sisanya diadopsi oleh process berikutnya setelah lock dilepas
+            try:
+                os.rmdir(self.job_directory)
+                os.remove(self.job_directory + ".lock")
+            except OSError:
+                pass
+
+            self._lock_file.close()
+            self._lock_file = None
+
+    def spool(self, file: BinaryIO, key: str, bucket: str, content_type: str | None = None) -> str:
+        job_id = f"{int(time.time() * 1000)}-{secrets.token_hex(8)}"
+        data_path = self._data_path(job_id)
+
+        with open(data_path + ".tmp", "wb") as destination:
+            shutil.copyfileobj(file, destination)
+            destination.flush()
+            os.fsync(destination.fileno())
+
+        os.replace(data_path + ".tmp", data_path)
+
+        self._write_meta(job_id, {"key": key, "bucket": bucket, "content_type": content_type, "attempts": 0, "spooled_at": time.time()})
+
+        self._schedule(job_id, time.monotonic())
+
+        return job_id
+
+    def depth(self) -> int:
+        with self._condition:
+            return len(self._heap)
+
+    def _data_path(self, job_id: str) -> str:
+        return os.path.join(self.job_directory, f"{job_id}.data")
+
+    def _meta_path(self, job_id: str) -> str:
+        return os.path.join(self.job_directory, f"{job_id}.json")
+
+    def _write_meta(self, job_id: str, meta: dict):
+        meta_path = self._meta_path(job_id)
+
+        with open(meta_path + ".tmp", "w") as destination:
+            json.dump(meta, destination)
+            destination.flush()
+            os.fsync(destination.fileno())
+
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _schedule(self, job_id: str, ready_at: float):
+        with self._condition:
+            heapq.heappush(self._heap, (ready_at, job_id))
+            upload_queue_depth.set(len(self._heap))
+            self._condition.notify()
+
+    def _next_job(self) -> str | None:
+        with self._condition:
+            while self._running:
+                if self._heap:
+                    ready_at, job_id = self._heap[0]
+                    delay = ready_at - time.monotonic()
+
+                    if delay <= 0:
+                        heapq.heappop(self._heap)
+                        upload_queue_depth.set(len(self._heap))
+                        return job_id
+
+                    self._condition.wait(delay)
+                else:
+                    self._condition.wait()
+
+        return None
+
+    def _worker(self):
+        while True:
+            job_id = self._next_job()
+
+            if job_id is None:
+                return
+
+            try:
+                self._process(job_id)
+            except Exception:
+                logger.exception("Unexpected error while processing upload %s", job_id)
+
+    def _process(self, job_id: str):
+        with open(self._meta_path(job_id)) as source:
+            meta = json.load(source)
+
+        started = time.perf_counter()
+
+        try:
+            with open(self._data_path(job_id), "rb") as data:
+                get_storage_gateway().upload_file(data, meta["key"], meta["bucket"], content_type=meta["content_type"])
+        except Exception as e:
+            if not _already_uploaded(e):
+                upload_latency.observe(time.perf_counter() - started, outcome="error")
+                self._retry_or_fail(job_id, meta, e)
+                return
+
+        upload_latency.observe(time.perf_counter() - started, outcome="success")
+        upload_spool_age.observe(time.time() - meta["spooled_at"])
+
+        os.remove(self._data_path(job_id))
+        os.remove(self._meta_path(job_id))
+
+    def _retry_or_fail(self, job_id: str, meta: dict, error: Exception):
+        meta["attempts"] += 1
+
+        if meta["attempts"] >= self.max_attempts:
+            upload_failures.inc()
+            logger.error("Giving up upload of %s after %d attempts: %s", meta["key"], meta["attempts"], error)
+
+            self._write_meta(job_id, meta)
+            os.replace(self._data_path(job_id), os.path.join(self.failed_directory, f"{job_id}.data"))
+            os.replace(self._meta_path(job_id), os.path.join(self.failed_directory, f"{job_id}.json"))
+            return
+
+        upload_retries.inc()
+
+        # Exponential backoff dengan jitter
+        delay = min(UPLOAD_RETRY_MAX_DELAY, UPLOAD_RETRY_BASE_DELAY * 2 ** (meta["attempts"] - 1))
+        delay = random.uniform(delay / 2, delay)
+
+        logger.warning("Upload of %s failed (attempt %d), retrying in %.1fs: %s", meta["key"], meta["attempts"], delay, error)
+
+        self._write_meta(job_id, meta)
+        self._schedule(job_id, time.monotonic() + delay)
+
+upload_queue = UploadQueue()
@@ -1,11 +1,19 @@
 import os
+import base64
+import hashlib
 import secrets
 
 from math import floor
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import BinaryIO
 
 from fastapi import UploadFile, HTTPException
+from PIL import Image, UnidentifiedImageError
 
-from google.cloud import storage
+from cloud_storage import get_storage_gateway
+from upload_queue import upload_queue
+from request_metrics import track_stage
 
 CLOUD_BUCKET = os.environ["CLOUD_BUCKET"] # Wajib buat env variabel sendiri
 CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY = os.environ.get("CLOUD_BUCKET_PHOTO_PROFILE_DIRECTORY", "")
@@ -17,12 +25,22 @@ PRICE_MODEL_NAME = os.environ["PRICE_MODEL_NAME"] # Wajib buat env variabel send
 
 CLOUD_BUCKET_RESOURCE = os.environ["CLOUD_BUCKET_RESOURCE"]
 
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+# Upload lewat upload session ditulis di bawah prefix ini sampai di-finalize, selalu disapu oleh reconciler
+UPLOAD_PENDING_PREFIX = os.environ.get("UPLOAD_PENDING_PREFIX", "pending/")
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", str(25_000_000)))
+
+# Pillow juga akan menolak decode gambar yang jauh melebihi batas ini
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
 IMAGE_MIME_TYPE = {
     "image/jpeg": ".jpg",
     "image/png": ".png",
     "image/webp": ".webp"
 }
 
+IMAGE_FORMAT = {"JPEG", "PNG", "WEBP"}
+
 def generate_random_name(length: int = 30) -> str:
     length_bytes = floor(length * 3 / 4)
     return secrets.token_urlsafe(length_bytes)
@@ -33,37 +51,96 @@ def extension_based_on_mime_type(mime_type: str) -> str:
     else:
         raise HTTPException(415, detail="File must be jpg, jpeg, png, or webp")
 
-def upload_file_to_cloud_storage(file: UploadFile, uploaded_filename: str, path: str, bucket: str = CLOUD_BUCKET):
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket)
-    blob = bucket.blob(f"{path}{uploaded_filename}")
+def validate_image_file(file: BinaryIO, size: int | None = None):
+    if size is not None and size > UPLOAD_MAX_BYTES:
+        raise HTTPException(413, detail="File too large")
 
-    generation_match_precondition = 0
+    # Image.open hanya membaca header, pixel belum di-decode
+    try:
+        with Image.open(file) as img:
+            image_format = img.format
+            width, height = img.size
+    except Image.DecompressionBombError:
+        raise HTTPException(413, detail="Image dimensions too large")
+    except UnidentifiedImageError:
+        raise HTTPException(415, detail="File must be jpg, jpeg, png, or webp")
+    finally:
+        file.seek(0)
 
-    blob.upload_from_file(file.file, content_type=file.content_type, if_generation_match=generation_match_precondition)
+    if image_format not in IMAGE_FORMAT:
+        raise HTTPException(415, detail="File must be jpg, jpeg, png, or webp")
 
-def download_file_from_google_cloud(destination_file: str, object_file: str, path: str, bucket: str):
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket)
+    if width * height > IMAGE_MAX_PIXELS:
+        raise HTTPException(413, detail="Image dimensions too large")
 
-    blob = bucket.blob(f"{path}{object_file}")
-    blob.download_to_filename(destination_file)
+def encode_history_cursor(created_at: datetime, id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{id}".encode()).decode().rstrip("=")
 
-def get_cloud_storage_public_url(filename: str, path: str):
-    public_url = f"https://storage.googleapis.com/{CLOUD_BUCKET}/{path}{filename}"
+def decode_history_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split("|")
+        return datetime.fromisoformat(created_at), int(id)
+    except Exception:
+        raise HTTPException(400, detail="Invalid cursor")
 
-    return public_url
+def generate_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:20]}"'
+
+def format_http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+def is_not_modified(if_none_match: str | None, if_modified_since: str | None, etag: str, last_modified: datetime | None) -> bool:
+    # If-None-Match lebih diutamakan daripada If-Modified-Since (RFC 9110)
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
 
-def delete_file_on_cloud_storage(filename: str, path: str):
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(CLOUD_BUCKET)
-    blob = bucket.blob(f"{path}{filename}")
-    generation_match_precondition = None
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
 
-    blob.reload()
-    generation_match_precondition = blob.generation
+        return last_modified.replace(microsecond=0) <= since
 
-    blob.delete(if_generation_match=generation_match_precondition)
+    return False
+
+@track_stage("storage")
+def spool_file_to_cloud_storage(file: UploadFile, uploaded_filename: str, path: str, bucket: str = CLOUD_BUCKET):
+    file.file.seek(0)
+    upload_queue.spool(file.file, f"{path}{uploaded_filename}", bucket, content_type=file.content_type)
+
+@track_stage("storage")
+def create_upload_session_url(uploaded_filename: str, path: str, content_type: str, size: int, bucket: str = CLOUD_BUCKET) -> str:
+    return get_storage_gateway().create_upload_session(f"{UPLOAD_PENDING_PREFIX}{path}{uploaded_filename}", bucket, content_type, size)
+
+@track_stage("storage")
+def get_uploaded_file_size(uploaded_filename: str, path: str, bucket: str = CLOUD_BUCKET) -> int | None:
+    return get_storage_gateway().object_size(f"{UPLOAD_PENDING_PREFIX}{path}{uploaded_filename}", bucket)
+
+@track_stage("storage")
+def open_uploaded_file(uploaded_filename: str, path: str, bucket: str = CLOUD_BUCKET) -> BinaryIO:
+    return get_storage_gateway().open_read(f"{UPLOAD_PENDING_PREFIX}{path}{uploaded_filename}", bucket)
+
+@track_stage("storage")
+def promote_uploaded_file(uploaded_filename: str, path: str, bucket: str = CLOUD_BUCKET):
+    get_storage_gateway().move(f"{UPLOAD_PENDING_PREFIX}{path}{uploaded_filename}", f"{path}{uploaded_filename}", bucket)
+
+@track_stage("storage")
+def download_file_from_google_cloud(destination_file: str, object_file: str, path: str, bucket: str):
+    get_storage_gateway().download_to_filename(f"{path}{object_file}", destination_file, bucket)
+
+def get_cloud_storage_public_url(filename: str, path: str):
+    public_url = get_storage_gateway().public_url(f"{path}{filename}", CLOUD_BUCKET)
+
+    return public_url
 
 def generate_reset_password_email_content(server_origin: str, uuid: str):
     content = """
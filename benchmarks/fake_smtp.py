@@ -0,0 +1,80 @@
+import threading
+import socketserver
+
+from email import message_from_bytes
+from email.message import Message
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    # Cukup untuk smtplib: EHLO, AUTH, MAIL, RCPT, DATA, NOOP, RSET, QUIT (tanpa STARTTLS)
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 fake-smtp ready")
+
+        while True:
+            line = self.rfile.readline()
+
+            if not line:
+                return
+
+            command = line.decode(errors="replace").strip().split(" ", 1)[0].upper()
+
+            if command == "EHLO":
+                self.wfile.write(b"250-fake-smtp\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif command == "HELO":
+                self.reply("250 fake-smtp")
+            elif command == "AUTH":
+                self.reply("235 Authentication successful")
+            elif command in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                self.server.sink.store(self.read_data())
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def read_data(self) -> bytes:
+        lines = []
+
+        while True:
+            line = self.rfile.readline()
+
+            if not line or line == b".\r\n":
+                return b"".join(lines)
+
+            # Dot-stuffing dari client dibuang
+            lines.append(line[1:] if line.startswith(b"..") else line)
+
+class FakeSMTPServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.messages: list[Message] = []
+        self._lock = threading.Lock()
+
+        self._server = socketserver.ThreadingTCPServer((host, port), _SMTPHandler)
+        self._server.daemon_threads = True
+        self._server.sink = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-smtp", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def store(self, data: bytes):
+        with self._lock:
+            self.messages.append(message_from_bytes(data))
+
+    def messages_to(self, address: str) -> list[Message]:
+        with self._lock:
+            return [message for message in self.messages if message["To"] == address]
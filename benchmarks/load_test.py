@@ -0,0 +1,522 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+from datetime import datetime
+
+import httpx
+
+from stand_ins import generate_stand_in_models, generate_image, generate_price_inputs
+from fake_smtp import FakeSMTPServer
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIRECTORY = os.path.join(ROOT_DIRECTORY, "benchmarks")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIRECTORY, "baselines", "load_test.json")
+RESULTS_DIRECTORY = os.path.join(BENCHMARK_DIRECTORY, "results")
+
+RESET_LINK_REGEX = re.compile(r"/reset-password/([A-Za-z0-9_\-.]+)")
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, endpoint: str, duration: float, ok: bool):
+        self.samples.setdefault(endpoint, []).append(duration)
+
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        result = {}
+
+        for endpoint, durations in sorted(self.samples.items()):
+            durations = sorted(durations)
+
+            result[endpoint] = {
+                "count": len(durations),
+                "errors": self.errors.get(endpoint, 0),
+                "rps": round(len(durations) / elapsed, 2),
+                "p50_ms": round(percentile(durations, 50) * 1000, 2),
+                "p95_ms": round(percentile(durations, 95) * 1000, 2),
+                "p99_ms": round(percentile(durations, 99) * 1000, 2)
+            }
+
+        return result
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    # Nearest-rank
+    index = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+
+    return sorted_values[index]
+
+class VirtualUser:
+    def __init__(self, index: int, run_id: str):
+        self.email = f"bench{run_id}u{index}@example.com"
+        self.username = f"bench{run_id}u{index}"
+        self.password = "Benchmark1"
+        self.token = None
+        self.history_ids = []
+        self.password_version = 0
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def next_password(self) -> str:
+        self.password_version += 1
+
+        return f"Benchmark{self.password_version + 1}"
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, smtp: FakeSMTPServer, recorder: Recorder, seed: int):
+        self.client = client
+        self.smtp = smtp
+        self.recorder = recorder
+        self.random = random.Random(seed)
+
+        self.jpeg = generate_image(640, 480, "JPEG", seed)
+        self.png = generate_image(256, 256, "PNG", seed + 1)
+        self.price_inputs = generate_price_inputs(200, seed)
+
+        # (bobot, fungsi), kira-kira mengikuti pola pemakaian aplikasi android
+        self.actions = [
+            (20, self.get_user),
+            (15, self.estimate_price),
+            (8, self.recognize_image),
+            (15, self.list_histories),
+            (10, self.get_history),
+            (2, self.export_histories),
+            (5, self.login),
+            (3, self.update_data),
+            (2, self.update_photo_profile),
+            (2, self.upload_photo_profile_session),
+            (2, self.upload_motor_image_session),
+            (1, self.delete_photo_profile),
+            (1, self.update_password),
+            (1, self.reset_password),
+            (1, self.get_metrics)
+        ]
+
+    async def request(self, endpoint: str, method: str, url: str, expected: tuple = (), **kwargs) -> httpx.Response | None:
+        started = time.perf_counter()
+
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(endpoint, time.perf_counter() - started, False)
+            return None
+
+        self.recorder.record(endpoint, time.perf_counter() - started, response.status_code < 400 or response.status_code in expected)
+
+        return response
+
+    def pick_action(self):
+        total = sum(weight for weight, _ in self.actions)
+        choice = self.random.uniform(0, total)
+
+        for weight, action in self.actions:
+            choice -= weight
+
+            if choice <= 0:
+                return action
+
+        return self.actions[-1][1]
+
+    async def register(self, user: VirtualUser):
+        response = await self.request("POST /user/register", "POST", "/user/register", data={
+            "email": user.email,
+            "password": user.password,
+            "confirm_password": user.password,
+            "username": user.username,
+            "name": "Benchmark User"
+        }, files={"photo_profile": ("photo.jpg", self.jpeg, "image/jpeg")})
+
+        response.raise_for_status()
+        user.token = response.json()["access_token"]
+
+    async def delete_account(self, user: VirtualUser):
+        await self.request("DELETE /user", "DELETE", "/user", headers=user.headers)
+
+    async def get_user(self, user: VirtualUser):
+        await self.request("GET /user", "GET", "/user", headers=user.headers)
+
+    async def estimate_price(self, user: VirtualUser):
+        await self.request("POST /ai-models/motor-price-estimator", "POST", "/ai-models/motor-price-estimator", headers=user.headers, data=self.random.choice(self.price_inputs))
+
+    async def recognize_image(self, user: VirtualUser):
+        response = await self.request("POST /ai-models/motor-image-recognition", "POST", "/ai-models/motor-image-recognition", expected=(400,), headers=user.headers, files={"photo": ("motor.jpg", self.jpeg, "image/jpeg")})
+
+        if response is not None and response.status_code == 200:
+            # Hasil prediksi gambar dipakai untuk estimasi harga, seperti alur di aplikasi
+            await self.request("POST /ai-models/motor-price-estimator", "POST", "/ai-models/motor-price-estimator", headers=user.headers, data={
+                **self.random.choice(self.price_inputs),
+                "id_picture": response.json()["id_picture"],
+                "model": response.json()["model"]
+            })
+
+    async def list_histories(self, user: VirtualUser):
+        response = await self.request("GET /histories", "GET", "/histories", headers=user.headers, params={"limit": 20})
+
+        if response is not None and response.status_code == 200:
+            user.history_ids = [history["id"] for history in response.json()["histories"]]
+
+            # Sebagian client mengirim ulang ETag, server seharusnya menjawab 304
+            if self.random.random() < 0.5 and "etag" in response.headers:
+                await self.request("GET /histories (conditional)", "GET", "/histories", headers={**user.headers, "If-None-Match": response.headers["etag"]}, params={"limit": 20})
+
+    async def get_history(self, user: VirtualUser):
+        if not user.history_ids:
+            return await self.list_histories(user)
+
+        history_id = self.random.choice(user.history_ids)
+
+        await self.request("GET /history/{id}", "GET", f"/history/{history_id}", headers=user.headers)
+
+    async def export_histories(self, user: VirtualUser):
+        await self.request("GET /histories/export", "GET", "/histories/export", headers=user.headers, params={"format": self.random.choice(["csv", "ndjson"])})
+
+    async def login(self, user: VirtualUser):
+        response = await self.request("POST /user/login", "POST", "/user/login", data={"email": user.email, "password": user.password})
+
+        if response is not None and response.status_code == 200:
+            user.token = response.json()["access_token"]
+
+    async def update_data(self, user: VirtualUser):
+        await self.request("PUT /user", "PUT", "/user", headers=user.headers, data={"name": f"Benchmark User {self.random.randint(0, 9999)}"})
+
+    async def update_photo_profile(self, user: VirtualUser):
+        await self.request("PATCH /user/photo-profile", "PATCH", "/user/photo-profile", headers=user.headers, files={"photo_profile": ("photo.png", self.png, "image/png")})
+
+    async def delete_photo_profile(self, user: VirtualUser):
+        await self.request("DELETE /user/photo-profile", "DELETE", "/user/photo-profile", expected=(400,), headers=user.headers)
+
+    async def _direct_upload(self, user: VirtualUser, prefix: str) -> httpx.Response | None:
+        response = await self.request(f"POST {prefix}/upload-session", "POST", f"{prefix}/upload-session", headers=user.headers, data={"content_type": "image/jpeg", "size": len(self.jpeg)})
+
+        if response is None or response.status_code != 200:
+            return None
+
+        session = response.json()
+        upload = await self.request("PUT /local-storage-upload/{bucket}/{key}", "PUT", session["upload_url"], content=self.jpeg, headers={"Content-Type": "image/jpeg"})
+
+        if upload is None or upload.status_code >= 400:
+            return None
+
+        return await self.request(f"POST {prefix}/finalize", "POST", f"{prefix}/finalize", expected=(400,), headers=user.headers, data={"upload_id": session["upload_id"]})
+
+    async def upload_photo_profile_session(self, user: VirtualUser):
+        await self._direct_upload(user, "/user/photo-profile")
+
+    async def upload_motor_image_session(self, user: VirtualUser):
+        await self._direct_upload(user, "/ai-models/motor-image-recognition")
+
+    async def update_password(self, user: VirtualUser):
+        new_password = user.next_password()
+
+        response = await self.request("PATCH /user/password", "PATCH", "/user/password", headers=user.headers, data={
+            "old_password": user.password,
+            "new_password": new_password,
+            "confirm_new_password": new_password
+        })
+
+        if response is not None and response.status_code == 200:
+            user.password = new_password
+
+    async def reset_password(self, user: VirtualUser):
+        already_sent = len(self.smtp.messages_to(user.email))
+
+        # 400 berarti masih dalam jeda 10 menit dari permintaan sebelumnya
+        response = await self.request("POST /user/forgot-password", "POST", "/user/forgot-password", expected=(400,), data={"email": user.email})
+
+        if response is None or response.status_code != 200:
+            return
+
+        token = await self._wait_for_reset_token(user, already_sent)
+
+        if token is None:
+            return
+
+        await self.request("GET /reset-password/{uuid}", "GET", f"/reset-password/{token}")
+
+        new_password = user.next_password()
+
+        response = await self.request("POST /reset-password", "POST", "/reset-password", data={"token": token, "password": new_password, "confirm_password": new_password})
+
+        if response is not None and response.status_code == 200:
+            user.password = new_password
+
+    async def _wait_for_reset_token(self, user: VirtualUser, already_sent: int, timeout: float = 10) -> str | None:
+        deadline = time.monotonic() + timeout
+
+        while time.monotonic() < deadline:
+            messages = self.smtp.messages_to(user.email)
+
+            if len(messages) > already_sent:
+                for part in messages[-1].walk():
+                    payload = part.get_payload(decode=True)
+                    match = RESET_LINK_REGEX.search(payload.decode()) if payload else None
+
+                    if match:
+                        return match.group(1)
+
+            await asyncio.sleep(0.05)
+
+        return None
+
+    async def get_metrics(self, user: VirtualUser):
+        await self.request("GET /metrics", "GET", "/metrics")
+
+    async def run_user(self, user: VirtualUser, deadline: float):
+        while time.monotonic() < deadline:
+            await self.pick_action()(user)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def server_environment(args, work_directory: str, port: int, smtp_port: int, image_model_path: str, price_model_path: str) -> dict:
+    base_url = f"http://127.0.0.1:{port}"
+
+    return {
+        **os.environ,
+        "APP_ENV": "dev",
+        "DB_PORT": str(args.db_port),
+        "DB_USERNAME": args.db_username,
+        "DB_PASSWORD": args.db_password,
+        "DB_DATABASE": args.db_database,
+        "CLOUD_BUCKET": "benchmark",
+        "CLOUD_BUCKET_RESOURCE": "benchmark",
+        "IMAGE_MODEL_NAME": "image_model.keras",
+        "PRICE_MODEL_NAME": "price_model.joblib",
+        "IMAGE_MODEL_PATH": image_model_path,
+        "PRICE_MODEL_PATH": price_model_path,
+        "STORAGE_BACKEND": "local",
+        "LOCAL_STORAGE_DIRECTORY": os.path.join(work_directory, "storage"),
+        "LOCAL_STORAGE_PUBLIC_URL": f"{base_url}/local-storage",
+        "LOCAL_STORAGE_UPLOAD_URL": f"{base_url}/local-storage-upload",
+        "UPLOAD_SPOOL_DIRECTORY": os.path.join(work_directory, "spool"),
+        "SENDER_EMAIL": "benchmark@example.com",
+        "EMAIL_PASSWORD": "benchmark",
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp_port),
+        "SMTP_STARTTLS": "false",
+        # Throttle dilonggarkan, yang diukur adalah kapasitas server, bukan rate limit
+        "RATE_LIMIT_IP_PER_MINUTE": "1000000",
+        "RATE_LIMIT_IP_BURST": "1000000",
+        "RATE_LIMIT_ACCOUNT_PER_MINUTE": "1000000",
+        "RATE_LIMIT_ACCOUNT_BURST": "1000000",
+        "PASSWORD_HASH_MAX_PENDING": "1000",
+        # Route yang melebihi query budget-nya gagal dengan 500 dan muncul sebagai error di laporan
+        "DB_QUERY_BUDGET_MODE": "strict",
+        # Cache user dibuat cepat kedaluwarsa supaya query get_current_user ikut dihitung dalam budget
+        "USER_CACHE_TTL_SECONDS": "1"
+    }
+
+def start_database(args) -> str:
+    # Container dibuang lagi oleh stop_database, data benchmark tidak disimpan
+    name = f"hondealz-benchmark-db-{args.db_port}"
+
+    subprocess.run([
+        "docker", "run", "-d", "--rm", "--name", name,
+        "-p", f"127.0.0.1:{args.db_port}:3306",
+        "-e", f"MYSQL_ROOT_PASSWORD={args.db_password}",
+        "-e", f"MYSQL_DATABASE={args.db_database}",
+        args.db_image
+    ], check=True, stdout=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 180
+
+    # Server sementara saat inisialisasi tidak membuka TCP, jadi ping lewat 127.0.0.1 baru berhasil setelah MySQL siap
+    while time.monotonic() < deadline:
+        ping = subprocess.run(["docker", "exec", name, "mysqladmin", "ping", "-h", "127.0.0.1", "-uroot", f"-p{args.db_password}", "--silent"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        if ping.returncode == 0:
+            return name
+
+        time.sleep(1)
+
+    stop_database(name)
+    raise RuntimeError("MySQL container did not start in time")
+
+def stop_database(name: str):
+    subprocess.run(["docker", "rm", "-f", name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def start_server(environment: dict, port: int) -> subprocess.Popen:
+    # Tabel dibuat dengan SQLModel.metadata.create_all
+    subprocess.run([sys.executable, "app/database.py"], cwd=ROOT_DIRECTORY, env=environment, check=True)
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", "app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT_DIRECTORY,
+        env=environment
+    )
+
+    deadline = time.monotonic() + 180
+
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/metrics").status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+
+        time.sleep(0.5)
+
+    server.terminate()
+    raise RuntimeError("Server did not start in time")
+
+async def run_load_test(args, base_url: str, smtp: FakeSMTPServer) -> tuple[dict, float]:
+    recorder = Recorder()
+    run_id = datetime.now().strftime("%H%M%S")
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        load_test = LoadTest(client, smtp, recorder, args.seed)
+
+        # Satu virtual user per koneksi, jadi perubahan password tidak saling bertabrakan
+        users = [VirtualUser(i, run_id) for i in range(args.concurrency)]
+
+        await asyncio.gather(*(load_test.register(user) for user in users))
+
+        for _ in range(args.warmup_histories):
+            await asyncio.gather(*(load_test.estimate_price(user) for user in users))
+
+        recorder.samples.clear()
+        recorder.errors.clear()
+
+        started = time.monotonic()
+        await asyncio.gather(*(load_test.run_user(user, started + args.duration) for user in users))
+        elapsed = time.monotonic() - started
+
+        await asyncio.gather(*(load_test.delete_account(user) for user in users))
+
+    return recorder.summary(elapsed), elapsed
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+
+    for endpoint, current in results.items():
+        previous = baseline.get(endpoint)
+
+        if not previous:
+            continue
+
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if previous[key] and current[key] > previous[key] * (1 + threshold):
+                regressions.append(f"{endpoint} {key}: {previous[key]} -> {current[key]}")
+
+        if previous["rps"] and current["rps"] < previous["rps"] * (1 - threshold):
+            regressions.append(f"{endpoint} rps: {previous['rps']} -> {current['rps']}")
+
+    return regressions
+
+def print_report(results: dict, elapsed: float, baseline: dict):
+    print(f"\n{'endpoint':<55} {'count':>7} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'Δp95':>8}")
+
+    for endpoint, row in results.items():
+        previous = baseline.get(endpoint)
+        delta = f"{(row['p95_ms'] / previous['p95_ms'] - 1) * 100:+.0f}%" if previous and previous["p95_ms"] else ""
+
+        print(f"{endpoint:<55} {row['count']:>7} {row['errors']:>5} {row['rps']:>8} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {delta:>8}")
+
+    total = sum(row["count"] for row in results.values())
+    print(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of the HonDealz API against local stand-ins")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of mixed traffic")
+    parser.add_argument("--concurrency", type=int, default=16, help="Virtual users, each with its own account")
+    parser.add_argument("--warmup-histories", type=int, default=5, help="Price estimates per user before measuring")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--base-url", help="Benchmark an already running server instead of starting one (stand-in environment must match)")
+    parser.add_argument("--start-db", action=argparse.BooleanOptionalAction, default=True, help="Start a throwaway MySQL container for the run, --no-start-db uses a MySQL already listening on --db-port")
+    parser.add_argument("--db-image", default=os.environ.get("BENCH_DB_IMAGE", "mysql:8.0"))
+    parser.add_argument("--db-port", type=int, default=int(os.environ.get("BENCH_DB_PORT", "3307")))
+    parser.add_argument("--db-username", default=os.environ.get("BENCH_DB_USERNAME", "root"))
+    parser.add_argument("--db-password", default=os.environ.get("BENCH_DB_PASSWORD", "benchmark"))
+    parser.add_argument("--db-database", default=os.environ.get("BENCH_DB_DATABASE", "hondealz_benchmark"))
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change reported as a regression")
+    args = parser.parse_args()
+
+    smtp = FakeSMTPServer()
+    smtp.start()
+
+    server = None
+    database = None
+
+    with tempfile.TemporaryDirectory(prefix="hondealz-bench-") as work_directory:
+        try:
+            if args.base_url:
+                base_url = args.base_url
+            else:
+                if args.start_db:
+                    database = start_database(args)
+
+                image_model_path, price_model_path = generate_stand_in_models(os.path.join(BENCHMARK_DIRECTORY, ".artifacts"))
+                port = free_port()
+                server = start_server(server_environment(args, work_directory, port, smtp.port, image_model_path, price_model_path), port)
+                base_url = f"http://127.0.0.1:{port}"
+
+            results, elapsed = asyncio.run(run_load_test(args, base_url, smtp))
+        finally:
+            if server:
+                server.terminate()
+                server.wait(30)
+
+            if database:
+                stop_database(database)
+
+            smtp.stop()
+
+    baseline = {}
+
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as source:
+            baseline = json.load(source)["results"]
+    elif not args.save_baseline:
+        print(f"No baseline at {args.baseline}, record one on the reference machine with --save-baseline and commit it")
+
+    print_report(results, elapsed, baseline)
+
+    report = {"created_at": datetime.now().isoformat(), "duration": args.duration, "concurrency": args.concurrency, "results": results}
+
+    os.makedirs(RESULTS_DIRECTORY, exist_ok=True)
+
+    with open(os.path.join(RESULTS_DIRECTORY, f"load_test-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"), "w") as destination:
+        json.dump(report, destination, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+
+        with open(args.baseline, "w") as destination:
+            json.dump(report, destination, indent=2)
+
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.threshold)
+
+    if regressions:
+        print("\nRegressions against baseline:")
+        print("\n".join(f"  {regression}" for regression in regressions))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
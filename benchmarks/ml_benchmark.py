@@ -0,0 +1,126 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from PIL import Image
+
+from stand_ins import generate_stand_in_models, generate_image, generate_price_inputs
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIRECTORY = os.path.join(ROOT_DIRECTORY, "benchmarks")
+RESULTS_DIRECTORY = os.path.join(BENCHMARK_DIRECTORY, "results")
+
+# ml.py diimport langsung, tanpa predict.py yang butuh env dan cloud storage
+sys.path.insert(0, os.path.join(ROOT_DIRECTORY, "app"))
+
+DEFAULT_BATCH_SIZES = [1, 10, 100, 1000, 10000]
+
+def measure(function, repeat: int) -> dict:
+    # Waktu diukur tanpa tracemalloc, alokasi diukur di run terpisah karena tracemalloc memperlambat eksekusi
+    durations = []
+
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+
+    function()
+
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    durations.sort()
+
+    return {
+        "min_ms": round(durations[0] * 1000, 3),
+        "median_ms": round(durations[len(durations) // 2] * 1000, 3),
+        "peak_alloc_kib": round(peak / 1024, 1),
+        "retained_kib": round(current / 1024, 1)
+    }
+
+def repeat_for(batch_size: int, budget: int) -> int:
+    # Batch besar diulang lebih sedikit supaya total waktu benchmark tetap wajar
+    return max(1, min(20, budget // batch_size))
+
+def benchmark_image_model(predictor, batch_sizes: list[int], budget: int) -> list[dict]:
+    image = Image.open(io.BytesIO(generate_image(640, 480, "JPEG"))).convert("RGB")
+    rows = []
+
+    for batch_size in batch_sizes:
+        images = [image] * batch_size
+        repeat = repeat_for(batch_size, budget)
+
+        rows.append({"target": "MotorImagePredictor.preprocess_image", "batch_size": batch_size, **measure(lambda: [predictor.preprocess_image(img) for img in images], repeat)})
+
+        processed = np.concatenate([predictor.preprocess_image(image)] * batch_size)
+
+        rows.append({"target": "MotorImagePredictor.model.predict", "batch_size": batch_size, **measure(lambda: predictor.model.predict(processed, verbose=0), repeat)})
+        rows.append({"target": "MotorImagePredictor.predict_image", "batch_size": batch_size, **measure(lambda: [predictor.predict_image(img) for img in images], repeat)})
+
+    return rows
+
+def benchmark_price_model(predictor, batch_sizes: list[int], budget: int) -> list[dict]:
+    rows = []
+
+    for batch_size in batch_sizes:
+        inputs = generate_price_inputs(batch_size)
+        frame = pd.DataFrame(inputs)
+        repeat = repeat_for(batch_size, budget)
+
+        rows.append({"target": "MotorPricePredictorWithRange.transform", "batch_size": batch_size, **measure(lambda: predictor.transform(inputs), repeat)})
+        rows.append({"target": "MotorPricePredictorWithRange.predict", "batch_size": batch_size, **measure(lambda: [predictor.predict(data) for data in inputs], repeat)})
+        rows.append({"target": "MotorPricePredictorWithRange.batch_predict", "batch_size": batch_size, **measure(lambda: predictor.batch_predict(frame), repeat)})
+
+    return rows
+
+def print_report(rows: list[dict]):
+    print(f"\n{'target':<45} {'batch':>6} {'min ms':>11} {'median ms':>11} {'per item ms':>12} {'peak KiB':>11} {'kept KiB':>10}")
+
+    for row in rows:
+        per_item = row["median_ms"] / row["batch_size"]
+        print(f"{row['target']:<45} {row['batch_size']:>6} {row['min_ms']:>11} {row['median_ms']:>11} {per_item:>12.3f} {row['peak_alloc_kib']:>11} {row['retained_kib']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the ml.py hot paths against generated stand-in models")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--only", choices=["image", "price"], help="Benchmark only one of the models")
+    parser.add_argument("--image-max-batch", type=int, default=100, help="Image batches above this are skipped (one 224x224 image is ~600 KiB)")
+    parser.add_argument("--budget", type=int, default=2000, help="Items processed per measurement, bounds the number of repeats")
+    parser.add_argument("--image-model", help="Use a real .keras file instead of the stand-in")
+    parser.add_argument("--price-model", help="Use a real .joblib file instead of the stand-in")
+    args = parser.parse_args()
+
+    from ml import MotorImagePredictor, MotorPricePredictorWithRange
+
+    image_model_path, price_model_path = generate_stand_in_models(os.path.join(BENCHMARK_DIRECTORY, ".artifacts"))
+    rows = []
+
+    if args.only != "image":
+        price_model = MotorPricePredictorWithRange(model_path=args.price_model or price_model_path)
+        rows.extend(benchmark_price_model(price_model, args.batch_sizes, args.budget))
+
+    if args.only != "price":
+        image_model = MotorImagePredictor(model_path=args.image_model or image_model_path)
+        rows.extend(benchmark_image_model(image_model, [size for size in args.batch_sizes if size <= args.image_max_batch], args.budget))
+
+    print_report(rows)
+
+    os.makedirs(RESULTS_DIRECTORY, exist_ok=True)
+
+    with open(os.path.join(RESULTS_DIRECTORY, f"ml_benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"), "w") as destination:
+        json.dump({"created_at": datetime.now().isoformat(), "results": rows}, destination, indent=2)
+
+if __name__ == "__main__":
+    main()
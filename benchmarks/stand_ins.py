@@ -0,0 +1,117 @@
+import io
+import os
+
+import numpy as np
+
+MOTOR_MODELS = [
+    'All New Honda Vario 125 & 150',
+    'All New Honda Vario 125 & 150 Keyless',
+    'Vario 110',
+    'Vario 110 ESP',
+    'Vario 160',
+    'Vario Techno 110',
+    'Vario Techno 125 FI'
+]
+
+LOCATIONS = ["Jakarta Selatan", "Bandung", "Tangerang", "Semarang", "Sleman", "Surabaya", "Denpasar", "Medan"]
+
+NUMERICAL_FEATURES = [
+    'year', 'mileage', 'age', 'engine_size', 'age_squared', 'mileage_squared', 'price_per_cc',
+    'mileage_per_age', 'engine_age_interaction', 'normalized_mileage', 'depreciation_factor',
+    'is_abs', 'is_cbs', 'is_premium'
+]
+
+CATEGORICAL_FEATURES = ['province', 'age_category', 'price_segment', 'mileage_segment']
+
+# Kolom hasil pd.get_dummies di MotorPricePredictorWithRange.transform
+DUMMY_FEATURES = [
+    *[f"province_{province}" for province in ['Jakarta', 'Jawa Barat', 'Banten', 'Jawa Tengah', 'Yogyakarta', 'Jawa Timur', 'Bali', 'Others']],
+    *[f"age_category_{category}" for category in ['new', 'medium_new', 'medium_old', 'old']],
+    'price_segment_medium',
+    *[f"mileage_segment_{segment}" for segment in ['very_low', 'low', 'medium', 'high', 'very_high']]
+]
+
+def generate_image_model(path: str):
+    # Model kecil dengan input dan output yang sama (224x224x3 -> 7 kelas), bobotnya acak
+    import keras
+
+    model = keras.Sequential([
+        keras.Input(shape=(224, 224, 3)),
+        keras.layers.Conv2D(8, 3, strides=4, activation="relu"),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(len(MOTOR_MODELS), activation="softmax")
+    ])
+    model.compile(optimizer="adam", loss="categorical_crossentropy")
+    model.save(path)
+
+def generate_price_model(path: str, samples: int = 2000, seed: int = 0):
+    # Artifact dengan key yang sama seperti model asli, dilatih pada data sintetis
+    import joblib
+    import pandas as pd
+
+    from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+    from sklearn.preprocessing import StandardScaler
+    from xgboost import XGBRegressor
+
+    rng = np.random.default_rng(seed)
+    feature_columns = NUMERICAL_FEATURES + DUMMY_FEATURES
+
+    X = pd.DataFrame(rng.normal(size=(samples, len(feature_columns))), columns=feature_columns)
+    y = 18_000_000 - 1_200_000 * X['age'] - 400_000 * X['mileage'] + 900_000 * X['engine_size'] + rng.normal(0, 300_000, samples)
+
+    scaler = StandardScaler().fit(X)
+    X_scaled = pd.DataFrame(scaler.transform(X), columns=feature_columns)
+
+    models = {
+        'rf': RandomForestRegressor(n_estimators=10, max_depth=6, random_state=seed).fit(X_scaled, y),
+        'xgb': XGBRegressor(n_estimators=20, max_depth=4, random_state=seed).fit(X_scaled, y),
+        'gbm': GradientBoostingRegressor(n_estimators=20, max_depth=3, random_state=seed).fit(X_scaled, y)
+    }
+
+    joblib.dump({
+        'models': models,
+        'weights': {'rf': 0.3, 'xgb': 0.4, 'gbm': 0.3},
+        'feature_columns': feature_columns,
+        'numerical_features': NUMERICAL_FEATURES,
+        'categorical_features': CATEGORICAL_FEATURES,
+        'scaler': scaler
+    }, path)
+
+def generate_stand_in_models(directory: str) -> tuple[str, str]:
+    os.makedirs(directory, exist_ok=True)
+
+    image_model_path = os.path.join(directory, "image_model.keras")
+    price_model_path = os.path.join(directory, "price_model.joblib")
+
+    if not os.path.isfile(image_model_path):
+        generate_image_model(image_model_path)
+
+    if not os.path.isfile(price_model_path):
+        generate_price_model(price_model_path)
+
+    return image_model_path, price_model_path
+
+def generate_image(width: int = 640, height: int = 480, image_format: str = "JPEG", seed: int = 0) -> bytes:
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=image_format)
+
+    return buffer.getvalue()
+
+def generate_price_inputs(count: int, seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+
+    return [
+        {
+            "model": MOTOR_MODELS[rng.integers(len(MOTOR_MODELS))],
+            "year": int(rng.integers(2012, 2025)),
+            "mileage": int(rng.integers(0, 80_000)),
+            "location": LOCATIONS[rng.integers(len(LOCATIONS))],
+            "tax": "hidup" if rng.random() < 0.8 else "mati"
+        }
+        for _ in range(count)
+    ]